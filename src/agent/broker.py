@@ -1,15 +1,28 @@
+import asyncio
 import logging
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import pandas as pd
 
 from agent.character import LlmCharacter
 from alpaca.herder import AlpacaHerder
-from fox.messenger import ChatResponse, Messenger
+from fox.messenger import ChatMessage, ChatResponse, Messenger
 from stubs import NullRequest, Request, Response
 
 
 logger: logging.Logger = logging.getLogger(__name__)
 
+SCAN_DEPTH: int = 10
+MAX_SEEN_MESSAGES: int = 1000
+MAX_SENT_MESSAGES: int = 50
+PIPELINE_QUEUE_SIZE: int = 8
+RESOLVE_WORKERS: int = 2
+DISPATCH_WORKERS: int = 2
+# waits for new chat rows hold the browser thread, so they're sliced to let
+# responses go out in between
+SCAN_WAIT_SLICE: float = 0.5
+
 
 class Broker:
     def __init__(
@@ -25,7 +38,9 @@ class Broker:
         self.character: LlmCharacter = character
         self.herder: AlpacaHerder = herder
         self.max_lag: int = max_lag
-        self.last_seen: str = ""
+        self.seen_ids: OrderedDict[str, None] = OrderedDict()
+        self.sent_messages: deque[str] = deque(maxlen=MAX_SENT_MESSAGES)
+        self.last_handled: str = ""
         self.last_sent_ts: pd.Timestamp = pd.Timestamp.now()
 
     @staticmethod
@@ -34,54 +49,234 @@ class Broker:
         return " ".join(responses) if responses else None
 
     def _process_request(
-        self, request: Request, output_text: str | None
+        self, request: Request, output_text: Future[str | None]
     ) -> ChatResponse | None:
         if isinstance(request, NullRequest):
-            return ChatResponse(message=output_text) if output_text else None
+            text: str | None = output_text.result()
+            return ChatResponse(message=text) if text else None
 
         logger.info(f"Issuing request: {type(request)}")
         try:
             resp: Response = self.herder.dispatch_request(request)
         except Exception as e:
             logger.error(f"Encountered error: {str(e)}")
-            return ChatResponse(message=self.character.get_error_message)
+            return ChatResponse(message=self.character.get_error_message())
         else:
             logger.info(f"Received response: {type(resp)}")
             return ChatResponse(
-                message=self._join_messages(output_text, resp.message),
+                message=self._join_messages(output_text.result(), resp.message),
                 img_path=resp.path,
             )
 
+    def _take_new_messages(self, messages: list[ChatMessage]) -> list[str]:
+        """
+        Marks messages as seen and returns the unseen ones the broker didn't send
+        itself, oldest first.
+        """
+        seen: list[int] = [i for i, m in enumerate(messages) if m.id in self.seen_ids]
+        # with nothing recognisable on screen (e.g. the page reloaded and ids were
+        # reassigned) only the latest message can be new
+        first_new: int = seen[-1] + 1 if seen else max(len(messages) - 1, 0)
+        candidates: list[ChatMessage] = messages[first_new:]
+        for m in messages:
+            self.seen_ids[m.id] = None
+        while len(self.seen_ids) > MAX_SEEN_MESSAGES:
+            self.seen_ids.popitem(last=False)
+
+        new_messages: list[str] = [
+            m.text for m in candidates if m.text not in self.sent_messages
+        ]
+        if not seen and new_messages == [self.last_handled]:
+            return []
+        if new_messages:
+            self.last_handled = new_messages[-1]
+        return new_messages
+
+    def _respond(self, response: ChatResponse) -> None:
+        logger.info("Issuing chat response")
+        self.sent_messages.append(response.message)
+        self.messenger.respond(response)
+
     def start(self) -> None:
         logger.info(f"Starting broker {self.name}")
         self.messenger.wait()
+        # chat history from before startup is never acted on
+        for m in self.messenger.get_latest_messages(SCAN_DEPTH):
+            self.seen_ids[m.id] = None
         init_message: str = self.character.get_init_message()
-        self.messenger.respond(response=ChatResponse(message=init_message))
-        self.last_seen = init_message
+        self._respond(ChatResponse(message=init_message))
 
     def run(self) -> None:
         while True:
             self.messenger.wait()
             now: pd.Timestamp = pd.Timestamp.now()
 
-            message: str | None = self.messenger.get_latest_message()
-            if message is not None and message != self.last_seen:
+            messages: list[str] = self._take_new_messages(
+                self.messenger.get_latest_messages(SCAN_DEPTH)
+            )
+            responses: list[ChatResponse | None] = []
+            for message in messages:
                 logger.info(f"Processing new message: {message}")
                 request, output_text = self.character.resolve(message)
-                response = self._process_request(request, output_text)
-            elif (now - self.last_sent_ts).seconds > self.max_lag:
-                response = ChatResponse(message=self.character.get_random_phrase())
-            else:
+                responses.append(self._process_request(request, output_text))
+            if not messages and (now - self.last_sent_ts).seconds > self.max_lag:
+                responses.append(
+                    ChatResponse(message=self.character.get_random_phrase())
+                )
+
+            for response in responses:
+                if response is not None:
+                    self._respond(response)
+                    self.last_sent_ts = now
+
+    async def run_async(self) -> None:
+        """
+        Runs scanning, resolution, dispatch and responding as separate stages
+        joined by bounded queues, so a slow request doesn't hold up the chat.
+        Selenium calls share a single thread since the driver isn't thread-safe.
+        """
+        browser: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="browser"
+        )
+        workers: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=RESOLVE_WORKERS + DISPATCH_WORKERS,
+            thread_name_prefix="broker",
+        )
+        messages: asyncio.Queue[str] = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        requests: asyncio.Queue[tuple[Request, Future[str | None]]] = asyncio.Queue(
+            maxsize=PIPELINE_QUEUE_SIZE
+        )
+        responses: asyncio.Queue[ChatResponse] = asyncio.Queue(
+            maxsize=PIPELINE_QUEUE_SIZE
+        )
+
+        stages: list = [
+            self._scan_messages(browser, workers, messages, responses),
+            self._send_responses(browser, responses),
+        ]
+        stages += [
+            self._resolve_messages(workers, messages, requests)
+            for _ in range(RESOLVE_WORKERS)
+        ]
+        stages += [
+            self._dispatch_requests(workers, requests, responses)
+            for _ in range(DISPATCH_WORKERS)
+        ]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            browser.shutdown(wait=False, cancel_futures=True)
+            workers.shutdown(wait=False, cancel_futures=True)
+
+    async def _scan_messages(
+        self,
+        browser: ThreadPoolExecutor,
+        workers: ThreadPoolExecutor,
+        messages: asyncio.Queue,
+        responses: asyncio.Queue,
+    ) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            await self._wait_for_messages(browser)
+            now: pd.Timestamp = pd.Timestamp.now()
+
+            try:
+                latest: list[ChatMessage] = await loop.run_in_executor(
+                    browser, self.messenger.get_latest_messages, SCAN_DEPTH
+                )
+            except Exception as e:
+                logger.error(f"Failed to scan messages: {str(e)}")
                 continue
+            new_messages: list[str] = self._take_new_messages(latest)
+            for message in new_messages:
+                logger.info(f"Queueing new message: {message}")
+                await messages.put(message)
+            # responses land while this scan awaits, so last_sent_ts can be after
+            # now; .seconds would wrap that negative gap round to almost a day
+            idle: float = (now - self.last_sent_ts).total_seconds()
+            if not new_messages and idle > self.max_lag:
+                self.last_sent_ts = now
+                try:
+                    phrase: str = await loop.run_in_executor(
+                        workers, self.character.get_random_phrase
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to generate random phrase: {str(e)}")
+                    continue
+                await responses.put(ChatResponse(message=phrase))
 
+    async def _wait_for_messages(self, browser: ThreadPoolExecutor) -> None:
+        """Returns once a new chat row shows up, or after the scan delay."""
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        deadline: float = loop.time() + self.messenger.next_scan_delay()
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                woken: bool = await loop.run_in_executor(
+                    browser, self.messenger.wait, min(remaining, SCAN_WAIT_SLICE)
+                )
+            except Exception as e:
+                logger.error(f"Failed to wait for messages: {str(e)}")
+                await asyncio.sleep(remaining)
+                return
+            if woken:
+                return
+
+    async def _resolve_messages(
+        self,
+        workers: ThreadPoolExecutor,
+        messages: asyncio.Queue,
+        requests: asyncio.Queue,
+    ) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            message: str = await messages.get()
+            logger.info(f"Processing new message: {message}")
+            try:
+                request, output_text = await loop.run_in_executor(
+                    workers, self.character.resolve, message
+                )
+            except Exception as e:
+                logger.error(f"Failed to resolve message: {str(e)}")
+                continue
+            await requests.put((request, output_text))
+
+    async def _dispatch_requests(
+        self,
+        workers: ThreadPoolExecutor,
+        requests: asyncio.Queue,
+        responses: asyncio.Queue,
+    ) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            request, output_text = await requests.get()
+            try:
+                response: ChatResponse | None = await loop.run_in_executor(
+                    workers, self._process_request, request, output_text
+                )
+            except Exception as e:
+                logger.error(f"Failed to process request: {str(e)}")
+                continue
             if response is not None:
-                logger.info("Issuing chat response")
-                self.messenger.respond(response)
-                self.last_seen = response.message
-                self.last_sent_ts = now
-            else:
-                self.last_seen = message
+                await responses.put(response)
+
+    async def _send_responses(
+        self, browser: ThreadPoolExecutor, responses: asyncio.Queue
+    ) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            response: ChatResponse = await responses.get()
+            try:
+                await loop.run_in_executor(browser, self._respond, response)
+            except Exception as e:
+                logger.error(f"Failed to send response: {str(e)}")
+                continue
+            self.last_sent_ts = pd.Timestamp.now()
 
     def stop(self) -> None:
         logger.info(f"Shutting down broker {self.name}")
+        logger.info(
+            f"Structured output parse stats: {self.character.get_parse_stats()}"
+        )
+        logger.info(f"Completion stats:\n{self.character.dump_completion_stats()}")
         self.messenger.shutdown()
+        self.herder.shutdown()
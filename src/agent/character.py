@@ -1,10 +1,26 @@
 import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import Callable
 
-from openai import OpenAI
-from openai.types.chat import ChatCompletion
+import httpx
+from openai import OpenAI, Stream
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 
+from agent.examples import ExampleIndex
+from agent.intent import IntentParser
+from agent.schema import (
+    RESPONSE_FORMAT,
+    STRUCTURED_OUTPUT_CONTEXT,
+    StructuredOutputParser,
+)
+from agent.stats import CompletionStats
 from errors import ContextParsingError, UnexpectedGptResponse
 from stubs import (
     GetOrdersRequest,
@@ -18,6 +34,8 @@ from stubs import (
 )
 
 
+logger: logging.Logger = logging.getLogger(__name__)
+
 ALLOWED_EVAL_OBJECTS: dict[str, type] = {
     "NullRequest": NullRequest,
     "GetOrdersRequest": GetOrdersRequest,
@@ -33,6 +51,20 @@ PROMPT_INIT_MESSAGE: str = "INIT"
 PROMPT_RAND_MESSAGE: str = "RAND"
 PROMPT_ERR_MESSAGE: str = "ERR"
 
+FEW_SHOT_EXAMPLES: int = 4
+PHRASE_POOL_DEPTH: int = 3
+PHRASE_DEDUP_WINDOW: int = 20
+# attempts at a fresh phrase before a duplicate is accepted
+MAX_DEDUP_ATTEMPTS: int = 3
+POOL_RETRY_WAIT: float = 5.0
+COMMENTARY_WORKERS: int = 4
+OUTPUT_DELIMITER: str = "|"
+MAX_REPAIR_RETRIES: int = 1
+REPAIR_PROMPT: str = (
+    "Your previous reply didn't match the schema ({error}). Reply again with the "
+    "corrected JSON object only."
+)
+
 CONTEXT_ROOT: Path = Path.cwd().parent / "context"
 SYSTEM_CONTEXT: str = f"""
 You are a character named {{name}}. You only respond to these commands:
@@ -57,9 +89,13 @@ You are a character named {{name}}. You only respond to these commands:
 
 Context details:
 {{details}}
-
+"""
+# examples in a context string are separated by blank lines, so one can span a
+# prompt line and the output it should produce
+EXAMPLE_DELIMITER: re.Pattern = re.compile(r"\n\s*\n")
+EXAMPLES_CONTEXT: str = """
 Examples:
-{{examples}}
+{examples}
 """
 
 
@@ -78,27 +114,153 @@ class GptOutput:
     def from_response(cls, resp: ChatCompletion) -> "GptOutput":
         try:
             raw: str = resp.choices[0].message.content
-            request_repr, text = raw.split("|")
+            request_repr, text = raw.split(OUTPUT_DELIMITER)
             return cls(
-                request=eval(request_repr, ALLOWED_EVAL_OBJECTS),
-                text=None if text == "None" else text,
+                request=cls.parse_request(request_repr),
+                text=cls.parse_text(text),
             )
         except Exception:
             raise UnexpectedGptResponse(raw)
 
+    @staticmethod
+    def parse_request(request_repr: str) -> Request:
+        return eval(request_repr, ALLOWED_EVAL_OBJECTS)
+
+    @staticmethod
+    def parse_text(text: str) -> str | None:
+        return None if text == "None" else text
+
+
+class PhrasePool:
+    """
+    Keeps up to `depth` pre-generated phrases ready, refilled on a background
+    thread so callers only pay for an LLM round trip when the pool runs dry.
+    Phrases served within the last `dedup_window` calls aren't repeated. A
+    `one_shot` pool is filled once and never refilled.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        generate: Callable[[], str],
+        depth: int,
+        dedup_window: int,
+        one_shot: bool = False,
+    ) -> None:
+        self.generate: Callable[[], str] = generate
+        self.depth: int = depth
+        self.one_shot: bool = one_shot
+        self.phrases: deque[str] = deque()
+        self.recent: deque[str] = deque(maxlen=dedup_window)
+        self.lock: threading.Lock = threading.Lock()
+        self.refill: threading.Event = threading.Event()
+        self.thread: threading.Thread = threading.Thread(
+            target=self._fill_forever, name=f"phrases-{name}", daemon=True
+        )
+        if self.depth > 0:
+            self.refill.set()
+            self.thread.start()
+
+    def get(self) -> str:
+        with self.lock:
+            phrase: str | None = self.phrases.popleft() if self.phrases else None
+        if not self.one_shot:
+            self.refill.set()
+        if phrase is None:
+            phrase = self.generate()
+        with self.lock:
+            self.recent.append(phrase)
+        return phrase
+
+    def _fill_forever(self) -> None:
+        while True:
+            self.refill.wait()
+            self.refill.clear()
+            while len(self.phrases) < self.depth:
+                try:
+                    phrase: str = self._generate_fresh()
+                except Exception as e:
+                    logger.error(f"Failed to pre-generate phrase: {str(e)}")
+                    time.sleep(POOL_RETRY_WAIT)
+                    continue
+                with self.lock:
+                    self.phrases.append(phrase)
+
+    def _generate_fresh(self) -> str:
+        for _ in range(MAX_DEDUP_ATTEMPTS):
+            phrase: str = self.generate()
+            with self.lock:
+                if phrase not in self.recent and phrase not in self.phrases:
+                    break
+        return phrase
+
 
 class LlmCharacter:
     def __init__(
-        self, name: str, openai_api_key: str, model: str, temperature: float
+        self,
+        name: str,
+        openai_api_key: str,
+        model: str,
+        temperature: float,
+        phrase_pool_depth: int = PHRASE_POOL_DEPTH,
+        phrase_dedup_window: int = PHRASE_DEDUP_WINDOW,
+        fast_intents: bool = True,
+        stream_completions: bool = False,
+        structured_output: bool = False,
+        max_repair_retries: int = MAX_REPAIR_RETRIES,
+        prompt_models: dict[str, str] | None = None,
+        few_shot_examples: int = FEW_SHOT_EXAMPLES,
+        transport: httpx.BaseTransport | None = None,
     ) -> None:
         self.name: str = name
-        self.client: OpenAI = OpenAI(api_key=openai_api_key)
+        # a custom transport (e.g. a record/replay cassette) sits under the client
+        self.client: OpenAI = OpenAI(
+            api_key=openai_api_key,
+            http_client=httpx.Client(transport=transport) if transport else None,
+        )
         self.model: str = model
+        # prompt type -> model, for prompts that shouldn't use the default model
+        self.prompt_models: dict[str, str] = prompt_models or {}
         self.temperature: float = temperature
-        self.context: GptInput = self._create_context(name)
+        self.completion_stats: CompletionStats = CompletionStats()
+        self.stream_completions: bool = stream_completions
+        self.structured_output: bool = structured_output
+        self.max_repair_retries: int = max_repair_retries
+        self.output_parser: StructuredOutputParser = StructuredOutputParser()
+        context: dict = self._load_context(name)
+        examples: list[str] = self._to_example_list(context["examples"])
+        # with few enough examples they're all kept in the fixed system prompt
+        self.example_index: ExampleIndex | None = (
+            ExampleIndex(examples) if 0 < few_shot_examples < len(examples) else None
+        )
+        self.few_shot_examples: int = few_shot_examples
+        self.context: GptInput = self._create_context(
+            name, context, examples=[] if self.example_index else examples
+        )
+        self.intent_parser: IntentParser | None = (
+            IntentParser(name) if fast_intents else None
+        )
+        self.commentary_workers: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=COMMENTARY_WORKERS, thread_name_prefix="commentary"
+        )
+        self.phrase_pools: dict[str, PhrasePool] = {
+            prompt: PhrasePool(
+                name=prompt,
+                generate=self._phrase_generator(prompt),
+                # the greeting is only needed once per run
+                depth=(
+                    min(phrase_pool_depth, 1)
+                    if prompt == PROMPT_INIT_MESSAGE
+                    else phrase_pool_depth
+                ),
+                dedup_window=phrase_dedup_window,
+                one_shot=prompt == PROMPT_INIT_MESSAGE,
+            )
+            for prompt in (PROMPT_INIT_MESSAGE, PROMPT_RAND_MESSAGE, PROMPT_ERR_MESSAGE)
+        }
 
     @staticmethod
-    def _create_context(name: str) -> GptInput:
+    def _load_context(name: str) -> dict:
         context_path: Path = CONTEXT_ROOT / f"{name}.json"
         if not context_path.exists():
             raise FileNotFoundError(
@@ -112,43 +274,214 @@ class LlmCharacter:
             assert "examples" in context, "Context JSON must contain example calls"
         except Exception as e:
             raise ContextParsingError(str(e))
+        return context
 
-        return GptInput(
-            role="system",
-            content=SYSTEM_CONTEXT.format(
-                name=name, details=context["details"], examples=context["examples"]
-            ),
-        )
+    @staticmethod
+    def _to_example_list(examples: list | dict | str) -> list[str]:
+        if isinstance(examples, str):
+            return [e.strip() for e in EXAMPLE_DELIMITER.split(examples) if e.strip()]
+        if isinstance(examples, dict):
+            return [f"{k} -> {v}" for k, v in examples.items()]
+        return [e if isinstance(e, str) else json.dumps(e) for e in examples]
+
+    @staticmethod
+    def _create_context(name: str, context: dict, examples: list[str]) -> GptInput:
+        content: str = SYSTEM_CONTEXT.format(name=name, details=context["details"])
+        if examples:
+            content += EXAMPLES_CONTEXT.format(examples="\n\n".join(examples))
+        return GptInput(role="system", content=content)
+
+    def _build_messages(self, prompt: str) -> list[dict]:
+        messages: list[GptInput] = [self.context]
+        if self.structured_output:
+            messages.append(GptInput(role="system", content=STRUCTURED_OUTPUT_CONTEXT))
+        # selected examples go after the fixed system prompt so it stays a
+        # cacheable prefix across calls
+        if self.example_index is not None:
+            examples: list[str] = self.example_index.top_k(
+                prompt, self.few_shot_examples
+            )
+            messages.append(
+                GptInput(
+                    role="system",
+                    content=EXAMPLES_CONTEXT.format(examples="\n\n".join(examples)),
+                )
+            )
+        messages.append(GptInput(role="user", content=prompt))
+        return [asdict(m) for m in messages]
 
     def _prompt_gpt(self, prompt: str) -> GptOutput:
-        messages: tuple[GptInput] = (
-            self.context,
-            GptInput(role="user", content=prompt),
-        )
+        if self.structured_output:
+            return self._prompt_structured(prompt)
+
+        resp: ChatCompletion = self._complete(prompt, self._build_messages(prompt))
+        return GptOutput.from_response(resp)
+
+    @staticmethod
+    def _prompt_type(prompt: str) -> str:
+        return prompt.partition(":")[0]
+
+    def _get_model(self, prompt: str) -> str:
+        return self.prompt_models.get(self._prompt_type(prompt), self.model)
+
+    def _complete(self, prompt: str, messages: list[dict], **kwargs) -> ChatCompletion:
+        model: str = self._get_model(prompt)
+        start: float = time.perf_counter()
         resp: ChatCompletion = self.client.chat.completions.create(
-            messages=[asdict(m) for m in messages],
-            model=self.model,
-            temperature=self.temperature,
+            messages=messages, model=model, temperature=self.temperature, **kwargs
         )
-        return GptOutput.from_response(resp)
+        self.completion_stats.record(
+            self._prompt_type(prompt), model, time.perf_counter() - start, resp.usage
+        )
+        return resp
+
+    def _prompt_structured(self, prompt: str) -> GptOutput:
+        """
+        Asks for a reply matching RESPONSE_FORMAT. An invalid reply is sent back
+        with the validation error for up to max_repair_retries corrections.
+        """
+        messages: list[dict] = self._build_messages(prompt)
+        repair_start: float | None = None
+        for retries in range(self.max_repair_retries + 1):
+            resp: ChatCompletion = self._complete(
+                prompt, messages, response_format=RESPONSE_FORMAT
+            )
+            raw: str = resp.choices[0].message.content or ""
+            try:
+                request, text = self.output_parser.parse(raw)
+            except ValueError as e:
+                logger.warning(f"Failed to parse structured reply: {str(e)}")
+                repair_start = repair_start or time.perf_counter()
+                messages += [
+                    {"role": "assistant", "content": raw},
+                    {"role": "user", "content": REPAIR_PROMPT.format(error=str(e))},
+                ]
+                continue
+
+            self._record_parse(retries, True, repair_start)
+            return GptOutput(request=request, text=text)
+
+        self._record_parse(self.max_repair_retries, False, repair_start)
+        raise UnexpectedGptResponse(raw)
+
+    def _record_parse(
+        self, retries: int, parsed: bool, repair_start: float | None
+    ) -> None:
+        repair_seconds: float = (
+            time.perf_counter() - repair_start if repair_start is not None else 0.0
+        )
+        self.output_parser.record(retries, parsed, repair_seconds)
+
+    def get_parse_stats(self) -> dict:
+        return self.output_parser.get_stats()
+
+    def dump_completion_stats(self) -> str:
+        return self.completion_stats.dump()
+
+    def _stream_gpt(self, prompt: str) -> tuple[Future[Request], Future[str | None]]:
+        """
+        Streams the completion on a worker thread. The request future resolves
+        as soon as the delimiter arrives, while the commentary keeps streaming.
+        """
+        request: Future[Request] = Future()
+        text: Future[str | None] = Future()
+        self.commentary_workers.submit(self._consume_stream, prompt, request, text)
+        return request, text
+
+    def _consume_stream(
+        self, prompt: str, request: Future[Request], text: Future[str | None]
+    ) -> None:
+        raw: str = ""
+        split: int = -1
+        model: str = self._get_model(prompt)
+        start: float = time.perf_counter()
+        try:
+            stream: Stream[ChatCompletionChunk] = self.client.chat.completions.create(
+                messages=self._build_messages(prompt),
+                model=model,
+                temperature=self.temperature,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            for chunk in stream:
+                if chunk.usage is not None:
+                    self.completion_stats.record(
+                        self._prompt_type(prompt),
+                        model,
+                        time.perf_counter() - start,
+                        chunk.usage,
+                    )
+                if not chunk.choices:
+                    continue
+                raw += chunk.choices[0].delta.content or ""
+                if split < 0 and OUTPUT_DELIMITER in raw:
+                    split = raw.index(OUTPUT_DELIMITER)
+                    request.set_result(GptOutput.parse_request(raw[:split]))
+            if split < 0:
+                raise UnexpectedGptResponse(raw)
+            text.set_result(GptOutput.parse_text(raw.partition(OUTPUT_DELIMITER)[2]))
+        except Exception as e:
+            if not request.done():
+                request.set_exception(
+                    e
+                    if isinstance(e, UnexpectedGptResponse)
+                    else UnexpectedGptResponse(raw)
+                )
+            else:
+                logger.error(f"Failed to stream commentary: {str(e)}")
+            text.set_result(None)
 
-    def resolve(self, input_message: str) -> tuple[Request, str | None]:
-        input_message: str = input_message.lower()
-        if self.name not in input_message:
-            return NullRequest(), None
+    def resolve(self, input_message: str) -> tuple[Request, Future[str | None]]:
+        """
+        Maps a chat message onto a request. The commentary comes back as a future
+        since messages the intent parser recognises are dispatched right away,
+        with the LLM only asked for the commentary in the background.
+        """
+        text: Future[str | None] = Future()
+        if self.name not in input_message.lower():
+            text.set_result(None)
+            return NullRequest(), text
+
+        request: Request | None = (
+            self.intent_parser.parse(input_message) if self.intent_parser else None
+        )
+        if request is not None:
+            logger.info(f"Resolved message locally: {type(request)}")
+            return request, self.commentary_workers.submit(
+                self._get_commentary, input_message.lower()
+            )
+
+        prompt: str = f"{PROMPT_RESOLVE}: {input_message.lower()}"
+        # a JSON reply has no early delimiter to dispatch on, so structured
+        # output always waits for the full completion
+        if self.stream_completions and not self.structured_output:
+            streamed_request, streamed_text = self._stream_gpt(prompt)
+            return streamed_request.result(), streamed_text
 
-        prompt: str = f"{PROMPT_RESOLVE}: {input_message}"
         output: GptOutput = self._prompt_gpt(prompt)
-        return output.request, output.text
+        text.set_result(output.text)
+        return output.request, text
 
-    def get_init_message(self) -> str:
-        output: GptOutput = self._prompt_gpt(PROMPT_INIT_MESSAGE)
+    def _get_commentary(self, input_message: str) -> str | None:
+        try:
+            output: GptOutput = self._prompt_gpt(f"{PROMPT_RESOLVE}: {input_message}")
+        except Exception as e:
+            logger.error(f"Failed to generate commentary: {str(e)}")
+            return None
         return output.text
 
+    def _phrase_generator(self, prompt: str) -> Callable[[], str]:
+        def generate() -> str:
+            output: GptOutput = self._prompt_gpt(prompt)
+            return output.text
+
+        return generate
+
+    def get_init_message(self) -> str:
+        return self.phrase_pools[PROMPT_INIT_MESSAGE].get()
+
     def get_random_phrase(self) -> str:
-        output: GptOutput = self._prompt_gpt(PROMPT_RAND_MESSAGE)
-        return output.text
+        return self.phrase_pools[PROMPT_RAND_MESSAGE].get()
 
     def get_error_message(self) -> str:
-        output: GptOutput = self._prompt_gpt(PROMPT_ERR_MESSAGE)
-        return output.text
+        return self.phrase_pools[PROMPT_ERR_MESSAGE].get()
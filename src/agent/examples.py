@@ -0,0 +1,54 @@
+import re
+
+import numpy as np
+
+
+TOKEN_PATTERN: re.Pattern = re.compile(r"[a-z0-9]+")
+BM25_K1: float = 1.5
+BM25_B: float = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class ExampleIndex:
+    """
+    BM25 index over the character's few-shot examples, built once so each prompt
+    can carry only the examples most relevant to it.
+    """
+
+    def __init__(
+        self, examples: list[str], k1: float = BM25_K1, b: float = BM25_B
+    ) -> None:
+        self.examples: list[str] = examples
+        docs: list[list[str]] = [tokenize(e) for e in examples]
+        self.vocab: dict[str, int] = {
+            term: i
+            for i, term in enumerate(sorted({term for doc in docs for term in doc}))
+        }
+
+        tf: np.ndarray = np.zeros((len(docs), len(self.vocab)))
+        for i, doc in enumerate(docs):
+            for term in doc:
+                tf[i, self.vocab[term]] += 1
+        doc_len: np.ndarray = tf.sum(axis=1, keepdims=True)
+        avg_len: float = max(float(doc_len.mean()), 1.0) if len(docs) else 1.0
+        df: np.ndarray = (tf > 0).sum(axis=0)
+        idf: np.ndarray = np.log1p((len(docs) - df + 0.5) / (df + 0.5))
+        # per (example, term) BM25 contribution, so scoring a query is a column sum
+        self.weights: np.ndarray = (
+            idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avg_len))
+        )
+
+    def top_k(self, query: str, k: int) -> list[str]:
+        """
+        The k best-scoring examples in their original order. Ties, including a
+        query with no known terms, fall back to the earliest examples.
+        """
+        term_ids: list[int] = [
+            self.vocab[term] for term in tokenize(query) if term in self.vocab
+        ]
+        scores: np.ndarray = self.weights[:, term_ids].sum(axis=1)
+        best: np.ndarray = np.sort(np.argsort(-scores, kind="stable")[:k])
+        return [self.examples[i] for i in best]
@@ -0,0 +1,174 @@
+import re
+
+from stubs import (
+    GetOrdersRequest,
+    GetPnlRequest,
+    GetPortfolioRequest,
+    MetricWindow,
+    OrderSide,
+    OrderType,
+    Request,
+    SubmitTradeRequest,
+)
+
+
+# tags each token is reduced to before the message is matched against a shape
+TAG_SIDE: str = "S"
+TAG_QTY: str = "Q"
+TAG_SYMBOL: str = "T"
+TAG_ORDER_TYPE: str = "O"
+TAG_WINDOW: str = "W"
+TAG_PNL: str = "P"
+TAG_ORDERS: str = "R"
+TAG_PORTFOLIO: str = "F"
+
+SIDE_WORDS: dict[str, OrderSide] = {"buy": OrderSide.BUY, "sell": OrderSide.SELL}
+ORDER_TYPE_WORDS: dict[str, OrderType] = {
+    "market": OrderType.MARKET,
+    "mkt": OrderType.MARKET,
+    "limit": OrderType.LIMIT,
+    "lmt": OrderType.LIMIT,
+}
+WINDOW_WORDS: dict[str, MetricWindow] = {
+    "daily": MetricWindow.DAILY,
+    "today": MetricWindow.DAILY,
+    "today's": MetricWindow.DAILY,
+    "weekly": MetricWindow.WEEKLY,
+    "week": MetricWindow.WEEKLY,
+    "monthly": MetricWindow.MONTHLY,
+    "month": MetricWindow.MONTHLY,
+    "total": MetricWindow.TOTAL,
+    "overall": MetricWindow.TOTAL,
+    "all-time": MetricWindow.TOTAL,
+}
+PNL_WORDS: frozenset[str] = frozenset({"pnl", "p&l", "p/l"})
+ORDERS_WORDS: frozenset[str] = frozenset({"orders", "trades", "fills"})
+PORTFOLIO_WORDS: frozenset[str] = frozenset({"portfolio", "positions", "holdings"})
+# words that carry no meaning for any request and are dropped before matching
+FILLER_WORDS: frozenset[str] = frozenset(
+    {
+        "hey",
+        "hi",
+        "yo",
+        "please",
+        "pls",
+        "me",
+        "my",
+        "our",
+        "the",
+        "a",
+        "an",
+        "show",
+        "get",
+        "give",
+        "list",
+        "for",
+        "this",
+        "of",
+        "share",
+        "shares",
+        "at",
+        "order",
+        "now",
+        "current",
+    }
+)
+# asking rather than telling, e.g. "would you buy 10 AAPL?", is left to the LLM
+MODAL_WORDS: frozenset[str] = frozenset(
+    {"can", "could", "would", "should", "will", "shall", "may", "might", "must"}
+)
+
+QTY_PATTERN: re.Pattern = re.compile(r"\d+(?:\.\d+)?")
+# tickers must be written in caps or $-prefixed, so plain words are never traded.
+# Single letters also need the $, so "I" or "A" in a sentence aren't read as tickers
+SYMBOL_PATTERN: re.Pattern = re.compile(
+    r"\$[A-Za-z]{1,5}(?:\.[A-Za-z])?|[A-Z]{2,5}(?:\.[A-Z])?"
+)
+TOKEN_STRIP_CHARS: str = ',.!?;:@"()'
+
+TRADE_SHAPE: re.Pattern = re.compile(r"OSQT|SQTO?")
+PNL_SHAPE: re.Pattern = re.compile(r"WP|PW")
+ORDERS_SHAPE: re.Pattern = re.compile(r"WR|RW")
+PORTFOLIO_SHAPE: re.Pattern = re.compile(r"F")
+
+
+class IntentParser:
+    """
+    Deterministic resolver for the handful of phrasings that map unambiguously
+    onto a request, e.g. "cardo buy 10 AAPL market" or "cardo daily pnl". Every
+    token must be accounted for, so anything looser is left to the LLM.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name_pattern: re.Pattern = re.compile(re.escape(name), re.IGNORECASE)
+
+    def parse(self, message: str) -> Request | None:
+        if message.rstrip().endswith("?"):
+            return None
+        tokens: list[str] = self._tokenize(message)
+        if any(t.lower() in MODAL_WORDS for t in tokens):
+            return None
+        tags: list[str] = []
+        for token in tokens:
+            tag: str | None = self._tag(token)
+            if tag is None:
+                return None
+            tags.append(tag)
+
+        shape: str = "".join(tags)
+        words: list[str] = [t.lower() for t in tokens]
+        if TRADE_SHAPE.fullmatch(shape):
+            return self._to_trade_request(tokens, shape)
+        if PNL_SHAPE.fullmatch(shape):
+            return GetPnlRequest(window=WINDOW_WORDS[words[shape.index(TAG_WINDOW)]])
+        if ORDERS_SHAPE.fullmatch(shape):
+            return GetOrdersRequest(window=WINDOW_WORDS[words[shape.index(TAG_WINDOW)]])
+        if PORTFOLIO_SHAPE.fullmatch(shape):
+            return GetPortfolioRequest()
+        return None
+
+    def _tokenize(self, message: str) -> list[str]:
+        tokens: list[str] = [
+            t.strip(TOKEN_STRIP_CHARS)
+            for t in self.name_pattern.sub(" ", message).split()
+        ]
+        return [t for t in tokens if t and t.lower() not in FILLER_WORDS]
+
+    @staticmethod
+    def _tag(token: str) -> str | None:
+        word: str = token.lower()
+        if word in SIDE_WORDS:
+            return TAG_SIDE
+        if word in ORDER_TYPE_WORDS:
+            return TAG_ORDER_TYPE
+        if word in WINDOW_WORDS:
+            return TAG_WINDOW
+        if word in PNL_WORDS:
+            return TAG_PNL
+        if word in ORDERS_WORDS:
+            return TAG_ORDERS
+        if word in PORTFOLIO_WORDS:
+            return TAG_PORTFOLIO
+        if QTY_PATTERN.fullmatch(token):
+            return TAG_QTY
+        if SYMBOL_PATTERN.fullmatch(token):
+            return TAG_SYMBOL
+        return None
+
+    @staticmethod
+    def _to_trade_request(tokens: list[str], shape: str) -> SubmitTradeRequest | None:
+        qty: float = float(tokens[shape.index(TAG_QTY)])
+        if qty <= 0:
+            return None
+
+        order_type: OrderType = (
+            ORDER_TYPE_WORDS[tokens[shape.index(TAG_ORDER_TYPE)].lower()]
+            if TAG_ORDER_TYPE in shape
+            else OrderType.MARKET
+        )
+        return SubmitTradeRequest(
+            symbol=tokens[shape.index(TAG_SYMBOL)].lstrip("$").upper(),
+            qty=qty,
+            side=SIDE_WORDS[tokens[shape.index(TAG_SIDE)].lower()],
+            type=order_type,
+        )
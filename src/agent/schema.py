@@ -0,0 +1,154 @@
+import threading
+from dataclasses import asdict, dataclass
+from enum import Enum
+
+from pydantic import BaseModel, ValidationError
+
+from stubs import (
+    GetOrdersRequest,
+    GetPnlRequest,
+    GetPortfolioRequest,
+    NullRequest,
+    Request,
+    SubmitTradeRequest,
+)
+
+
+REQUEST_TYPES: tuple[type[Request], ...] = (
+    NullRequest,
+    GetOrdersRequest,
+    GetPnlRequest,
+    GetPortfolioRequest,
+    SubmitTradeRequest,
+)
+KIND_FIELD: str = "kind"
+SCHEMA_NAME: str = "resolved_request"
+JSON_TYPES: dict[type, str] = {
+    str: "string",
+    float: "number",
+    int: "integer",
+    bool: "boolean",
+}
+
+STRUCTURED_OUTPUT_CONTEXT: str = f"""
+Ignore the request|text reply format above. Reply with a JSON object instead:
+- request: the request object, with `{KIND_FIELD}` set to the request name and
+  every enum given by its option name
+- text: the text part of the reply, or null
+"""
+
+
+class StructuredReply(BaseModel):
+    request: dict
+    text: str | None
+
+
+@dataclass(kw_only=True)
+class ParseStats:
+    replies: int = 0
+    parse_failures: int = 0
+    repair_retries: int = 0
+    repaired: int = 0
+    repair_seconds: float = 0.0
+
+
+def _field_schema(annotation: type) -> dict:
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        return {"type": "string", "enum": [x.name for x in annotation]}
+    return {"type": JSON_TYPES[annotation]}
+
+
+def _request_schema(request_type: type[Request]) -> dict:
+    properties: dict[str, dict] = {
+        KIND_FIELD: {"type": "string", "enum": [request_type.__name__]}
+    }
+    for field, info in request_type.model_fields.items():
+        properties[field] = _field_schema(info.annotation)
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def build_response_format() -> dict:
+    """Strict json_schema response format covering every request in REQUEST_TYPES."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": SCHEMA_NAME,
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "request": {"anyOf": [_request_schema(t) for t in REQUEST_TYPES]},
+                    "text": {"type": ["string", "null"]},
+                },
+                "required": ["request", "text"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+RESPONSE_FORMAT: dict = build_response_format()
+# enum fields of each request, so option names can be mapped back onto members
+ENUM_FIELDS: dict[str, dict[str, type[Enum]]] = {
+    t.__name__: {
+        field: info.annotation
+        for field, info in t.model_fields.items()
+        if isinstance(info.annotation, type) and issubclass(info.annotation, Enum)
+    }
+    for t in REQUEST_TYPES
+}
+REQUEST_TYPES_BY_KIND: dict[str, type[Request]] = {t.__name__: t for t in REQUEST_TYPES}
+
+
+class StructuredOutputParser:
+    """
+    Validates json_schema replies into request models and keeps count of the
+    replies that needed a repair round trip.
+    """
+
+    def __init__(self) -> None:
+        self.stats: ParseStats = ParseStats()
+        self.lock: threading.Lock = threading.Lock()
+
+    def parse(self, raw: str) -> tuple[Request, str | None]:
+        """Raises ValueError with a description of what's wrong with the reply."""
+        try:
+            reply: StructuredReply = StructuredReply.model_validate_json(raw)
+            args: dict = dict(reply.request)
+            kind: str = args.pop(KIND_FIELD, None)
+            if kind not in REQUEST_TYPES_BY_KIND:
+                raise ValueError(f"Unknown request {KIND_FIELD}: {kind}")
+            for field, enum_type in ENUM_FIELDS[kind].items():
+                if isinstance(args.get(field), str):
+                    args[field] = self._to_enum(enum_type, field, args[field])
+            request: Request = REQUEST_TYPES_BY_KIND[kind].model_validate(args)
+        except ValidationError as e:
+            raise ValueError(str(e))
+        return request, reply.text
+
+    @staticmethod
+    def _to_enum(enum_type: type[Enum], field: str, name: str) -> Enum:
+        try:
+            return enum_type[name.upper()]
+        except KeyError:
+            raise ValueError(
+                f"{field} must be one of {[x.name for x in enum_type]}, got {name}"
+            )
+
+    def record(self, retries: int, parsed: bool, repair_seconds: float) -> None:
+        with self.lock:
+            self.stats.replies += 1
+            if retries or not parsed:
+                self.stats.parse_failures += 1
+            self.stats.repair_retries += retries
+            self.stats.repaired += int(retries > 0 and parsed)
+            self.stats.repair_seconds += repair_seconds
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return asdict(self.stats)
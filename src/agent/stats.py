@@ -0,0 +1,67 @@
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+
+import pandas as pd
+from openai.types import CompletionUsage
+
+
+MAX_COMPLETION_RECORDS: int = 10_000
+
+
+@dataclass(kw_only=True, frozen=True)
+class CompletionRecord:
+    prompt_type: str
+    model: str
+    wall_time: float
+    prompt_tokens: int
+    completion_tokens: int
+
+
+class CompletionStats:
+    """In-process table of recent completions, summarised per prompt type and model."""
+
+    def __init__(self, max_records: int = MAX_COMPLETION_RECORDS) -> None:
+        self.records: deque[CompletionRecord] = deque(maxlen=max_records)
+        self.lock: threading.Lock = threading.Lock()
+
+    def record(
+        self,
+        prompt_type: str,
+        model: str,
+        wall_time: float,
+        usage: CompletionUsage | None,
+    ) -> None:
+        record: CompletionRecord = CompletionRecord(
+            prompt_type=prompt_type,
+            model=model,
+            wall_time=wall_time,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+        )
+        with self.lock:
+            self.records.append(record)
+
+    def to_df(self) -> pd.DataFrame:
+        with self.lock:
+            records: list[CompletionRecord] = list(self.records)
+        return pd.DataFrame(
+            [asdict(r) for r in records],
+            columns=list(CompletionRecord.__dataclass_fields__),
+        )
+
+    def summarize(self) -> pd.DataFrame:
+        return (
+            self.to_df()
+            .groupby(["prompt_type", "model"])
+            .agg(
+                calls=("wall_time", "size"),
+                mean_wall_time=("wall_time", "mean"),
+                p95_wall_time=("wall_time", lambda s: s.quantile(0.95)),
+                prompt_tokens=("prompt_tokens", "sum"),
+                completion_tokens=("completion_tokens", "sum"),
+            )
+        )
+
+    def dump(self) -> str:
+        return self.summarize().to_string()
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from enum import Enum, auto
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from errors import CassetteMiss
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+CASSETTE_ROOT: Path = Path.cwd().parent / "cassettes"
+
+
+class TransportMode(Enum):
+    LIVE = auto()
+    RECORD = auto()
+    REPLAY = auto()
+
+    @classmethod
+    def from_str(cls, s: str) -> "TransportMode":
+        try:
+            return TransportMode[s.upper()]
+        except KeyError:
+            raise ValueError(f"Cannot convert {s} into a valid TransportMode")
+
+
+class LatencyModel:
+    """
+    Synthetic response latency for replayed completions, given as a spec string:
+        none                        no delay
+        recorded                    the latency measured when recording
+        fixed:<secs>
+        uniform:<low>:<high>
+        lognormal:<median>:<sigma>
+    """
+
+    def __init__(self, spec: str = "none", seed: int | None = None) -> None:
+        kind, *params = spec.split(":")
+        if kind not in ("none", "recorded", "fixed", "uniform", "lognormal"):
+            raise ValueError(f"Cannot convert {spec} into a valid LatencyModel")
+        self.kind: str = kind
+        self.params: list[float] = [float(p) for p in params]
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self.lock: threading.Lock = threading.Lock()
+
+    def sample(self, recorded: float) -> float:
+        with self.lock:
+            match self.kind:
+                case "recorded":
+                    return recorded
+                case "fixed":
+                    return self.params[0]
+                case "uniform":
+                    return float(self.rng.uniform(*self.params))
+                case "lognormal":
+                    median, sigma = self.params
+                    return float(self.rng.lognormal(np.log(median), sigma))
+            return 0.0
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """
+    httpx transport for the OpenAI client that records completions to a JSONL
+    cassette, or replays them with no network. Requests are keyed on method, path
+    and body; identical requests replay their recordings in order, and once the
+    last is played the tape wraps back to the first, so a prompt repeated more
+    often than it was recorded keeps getting answers.
+    """
+
+    def __init__(
+        self,
+        mode: TransportMode,
+        cassette: Path,
+        latency: LatencyModel | None = None,
+    ) -> None:
+        self.mode: TransportMode = mode
+        self.cassette: Path = cassette
+        self.latency: LatencyModel = latency or LatencyModel()
+        self.lock: threading.Lock = threading.Lock()
+        self.tapes: dict[str, list[dict]] = defaultdict(list)
+        self.plays: dict[str, int] = defaultdict(int)
+        self.live: httpx.HTTPTransport | None = None
+
+        if mode == TransportMode.RECORD:
+            self.cassette.parent.mkdir(parents=True, exist_ok=True)
+            self.live = httpx.HTTPTransport()
+        else:
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.cassette, "r") as f:
+            for line in f:
+                entry: dict = json.loads(line)
+                self.tapes[entry["key"]].append(entry)
+        logger.info(
+            f"Loaded {sum(map(len, self.tapes.values()))} recordings from {self.cassette}"
+        )
+
+    @staticmethod
+    def _request_key(request: httpx.Request) -> str:
+        body: bytes = request.read()
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True).encode()
+        except ValueError:
+            pass
+        digest = hashlib.sha256()
+        digest.update(f"{request.method} {request.url.path}\n".encode())
+        digest.update(body)
+        return digest.hexdigest()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key: str = self._request_key(request)
+        if self.mode == TransportMode.RECORD:
+            return self._record(key, request)
+        return self._replay(key, request)
+
+    def _record(self, key: str, request: httpx.Request) -> httpx.Response:
+        start: float = time.perf_counter()
+        resp: httpx.Response = self.live.handle_request(request)
+        content: bytes = resp.read()
+        entry: dict = {
+            "key": key,
+            "status": resp.status_code,
+            "content_type": resp.headers.get("content-type", "application/json"),
+            "body": content.decode(),
+            "latency": time.perf_counter() - start,
+        }
+        with self.lock:
+            with open(self.cassette, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return httpx.Response(
+            status_code=entry["status"],
+            headers={"content-type": entry["content_type"]},
+            content=content,
+            request=request,
+        )
+
+    def _replay(self, key: str, request: httpx.Request) -> httpx.Response:
+        with self.lock:
+            tape: list[dict] = self.tapes.get(key, [])
+            if not tape:
+                raise CassetteMiss(key=key, cassette=str(self.cassette))
+            entry: dict = tape[self.plays[key] % len(tape)]
+            self.plays[key] += 1
+
+        time.sleep(self.latency.sample(entry["latency"]))
+        return httpx.Response(
+            status_code=entry["status"],
+            headers={"content-type": entry["content_type"]},
+            content=entry["body"].encode(),
+            request=request,
+        )
+
+    def close(self) -> None:
+        if self.live is not None:
+            self.live.close()
+
+
+def get_llm_transport(
+    mode: TransportMode,
+    cassette: str,
+    latency: str = "none",
+    seed: int | None = None,
+) -> CassetteTransport | None:
+    if mode == TransportMode.LIVE:
+        return None
+    return CassetteTransport(
+        mode=mode,
+        cassette=CASSETTE_ROOT / cassette,
+        latency=LatencyModel(latency, seed=seed),
+    )
@@ -1,6 +1,7 @@
 import datetime
 import random
 import sqlite3
+import threading
 from abc import ABC, abstractmethod
 from pathlib import Path
 from uuid import uuid4
@@ -10,22 +11,39 @@ from alpaca_trade_api.entity import Order
 from alpaca_trade_api.entity_v2 import BarsV2, QuoteV2
 from alpaca_trade_api.rest import REST
 
+from alpaca.utils import QuoteCache, RateLimiter
 from config.environment import Environment
 
 
 class AlpacaClient(ABC):
     FEED: str = "iex"
+    # alpaca's default account-wide quota
+    REQUESTS_PER_MINUTE: int = 200
+    QUOTE_TTL: float = 2.0
 
-    def __init__(self, base_url: str, api_key: str, api_secret: str, **kwargs) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        api_secret: str,
+        quote_ttl: float = QUOTE_TTL,
+        **kwargs,
+    ) -> None:
         self.client: REST = REST(
             key_id=api_key,
             secret_key=api_secret,
             base_url=base_url,
         )
+        self.rate_limiter: RateLimiter = RateLimiter(
+            max_requests=self.REQUESTS_PER_MINUTE, period=60.0
+        )
+        self.quote_cache: QuoteCache = QuoteCache(ttl=quote_ttl)
 
     def get_bars(
-        self, symbol: str, timeframe: str, start: str, end: str, limit: int
+        self, symbol: str | list[str], timeframe: str, start: str, end: str, limit: int
     ) -> BarsV2:
+        """Passing a list of symbols fetches one page of bars for all of them."""
+        self.rate_limiter.acquire()
         return self.client.get_bars(
             symbol=symbol,
             timeframe=timeframe,
@@ -36,14 +54,34 @@ class AlpacaClient(ABC):
         )
 
     def get_quote(self, symbol: str) -> QuoteV2:
-        return self.client.get_latest_quote(symbol=symbol, feed=self.FEED)
+        return self.get_quotes([symbol])[symbol]
+
+    def get_quotes(self, symbols: list[str]) -> dict[str, QuoteV2]:
+        """Latest quote per symbol, fetching any stale ones in a single request."""
+        quotes, missing = self.quote_cache.get(symbols)
+        if missing:
+            self.rate_limiter.acquire()
+            fetched: dict[str, QuoteV2] = dict(
+                self.client.get_latest_quotes(symbols=missing, feed=self.FEED)
+            )
+            self.quote_cache.put(fetched)
+            quotes.update(fetched)
+        return quotes
 
     @abstractmethod
     def get_order(self, id: str) -> Order:
         pass
 
     @abstractmethod
-    def list_orders(self, status: str, nested: bool) -> list[Order]:
+    def list_orders(
+        self,
+        status: str,
+        nested: bool,
+        after: str | None = None,
+        until: str | None = None,
+        limit: int | None = None,
+        direction: str | None = None,
+    ) -> list[Order]:
         pass
 
     @abstractmethod
@@ -65,12 +103,30 @@ class AlpacaClient(ABC):
 
 class LiveClient(AlpacaClient):
     def get_order(self, id: str) -> Order:
+        self.rate_limiter.acquire()
         return self.client.get_order(order_id=id)
 
-    def list_orders(self, status: str, nested: bool) -> list[Order]:
-        return self.client.list_orders(status=status, nested=nested)
+    def list_orders(
+        self,
+        status: str,
+        nested: bool,
+        after: str | None = None,
+        until: str | None = None,
+        limit: int | None = None,
+        direction: str | None = None,
+    ) -> list[Order]:
+        self.rate_limiter.acquire()
+        return self.client.list_orders(
+            status=status,
+            nested=nested,
+            after=after,
+            until=until,
+            limit=limit,
+            direction=direction,
+        )
 
     def cancel_order(self, id: str) -> None:
+        self.rate_limiter.acquire()
         return self.client.cancel_order(order_id=id)
 
     def submit_order(
@@ -82,6 +138,7 @@ class LiveClient(AlpacaClient):
         time_in_force: str,
         client_order_id: str,
     ) -> Order:
+        self.rate_limiter.acquire()
         return self.client.submit_order(
             symbol=symbol,
             qty=qty,
@@ -124,35 +181,85 @@ class TestClient(AlpacaClient):
         )
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """
-    GET_ORDER: str = "SELECT * FROM orders WHERE id = ?"
+    CREATE_INDEX: str = (
+        "CREATE INDEX IF NOT EXISTS orders_status_filled_at ON orders (status, filled_at)"
+    )
+    GET_ORDER: str = "SELECT *, filled_at AS submitted_at FROM orders WHERE id = ?"
     CANCEL_ORDER: str = "DELETE FROM orders WHERE id = ?"
-    LIST_ORDERS: str = "SELECT * FROM orders WHERE status = ?"
+    LIST_ORDERS: str = (
+        "SELECT *, filled_at AS submitted_at FROM orders WHERE status = ?"
+    )
+    # alpaca lists newest first unless asked otherwise
+    LIST_DIRECTIONS: frozenset[str] = frozenset(("asc", "desc"))
+    DEFAULT_LIST_DIRECTION: str = "desc"
 
     def __init__(
-        self, base_url: str, api_key: str, api_secret: str, test_id: str
+        self,
+        base_url: str,
+        api_key: str,
+        api_secret: str,
+        test_id: str,
+        quote_ttl: float = AlpacaClient.QUOTE_TTL,
     ) -> None:
-        super().__init__(base_url=base_url, api_key=api_key, api_secret=api_secret)
+        super().__init__(
+            base_url=base_url,
+            api_key=api_key,
+            api_secret=api_secret,
+            quote_ttl=quote_ttl,
+        )
         if not self.DB_PATH_ROOT.exists():
             self.DB_PATH_ROOT.mkdir(parents=True)
         db_path: Path = self.DB_PATH_ROOT / f"{test_id}.db"
-        self.conn: sqlite3.Connection = sqlite3.connect(db_path)
+        # the async broker submits and lists orders from its worker threads
+        self.conn: sqlite3.Connection = sqlite3.connect(
+            db_path, check_same_thread=False
+        )
         self.conn.row_factory = sqlite3.Row
+        self.lock: threading.Lock = threading.Lock()
         with self.conn:
             self.conn.execute(self.CREATE_TABLE)
+            self.conn.execute(self.CREATE_INDEX)
 
     def get_order(self, id: str) -> Order:
-        cur: sqlite3.Cursor = self.conn.execute(self.GET_ORDER, (id,))
-        row: dict = cur.fetchone()
+        with self.lock:
+            row: dict = self.conn.execute(self.GET_ORDER, (id,)).fetchone()
         if not row:
             raise ValueError(f"Order with ID {id} not found")
         return Order(dict(row))
 
-    def list_orders(self, status: str, nested: bool) -> list[Order]:
-        cur: sqlite3.Cursor = self.conn.execute(self.LIST_ORDERS, (status,))
-        return [Order(dict(row)) for row in cur.fetchall()]
+    def list_orders(
+        self,
+        status: str,
+        nested: bool,
+        after: str | None = None,
+        until: str | None = None,
+        limit: int | None = None,
+        direction: str | None = None,
+    ) -> list[Order]:
+        order: str = (direction or self.DEFAULT_LIST_DIRECTION).lower()
+        if order not in self.LIST_DIRECTIONS:
+            raise ValueError(f"Cannot list orders in direction {direction}")
+
+        # test orders fill on submission, so fill time doubles as submission time
+        query: str = self.LIST_ORDERS
+        params: list[str | int] = [status]
+        if after is not None:
+            query += " AND filled_at > ?"
+            params.append(self._to_db_ts(pd.Timestamp(after)))
+        if until is not None:
+            query += " AND filled_at < ?"
+            params.append(self._to_db_ts(pd.Timestamp(until)))
+        query += f" ORDER BY filled_at {order.upper()}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self.lock:
+            rows: list[sqlite3.Row] = self.conn.execute(query, params).fetchall()
+        return [Order(dict(row)) for row in rows]
 
     def cancel_order(self, id: str) -> None:
-        with self.conn:
+        with self.lock, self.conn:
             self.conn.execute(self.CANCEL_ORDER, (id,))
 
     def submit_order(
@@ -166,13 +273,13 @@ class TestClient(AlpacaClient):
     ) -> Order:
         order_id: str = str(uuid4())
         now: pd.Timestamp = pd.Timestamp.now(tz=datetime.timezone.utc)
-        filled_at: str = now.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        filled_at: str = self._to_db_ts(now)
         status: str = "filled"
-        quote: QuoteV2 = self.client.get_latest_quote(symbol=symbol, feed=self.FEED)
+        quote: QuoteV2 = self.get_quote(symbol)
         # random price for testing
         price: float = quote.ap * (1 + random.uniform(-0.03, 0.03))
 
-        with self.conn:
+        with self.lock, self.conn:
             self.conn.execute(
                 self.SUBMIT_ORDER,
                 (
@@ -201,9 +308,14 @@ class TestClient(AlpacaClient):
                 time_in_force=time_in_force,
                 status=status,
                 filled_at=filled_at,
+                submitted_at=filled_at,
             )
         )
 
+    @staticmethod
+    def _to_db_ts(ts: pd.Timestamp) -> str:
+        return ts.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
 
 def get_alpaca_client(
     env: Environment,
@@ -211,6 +323,7 @@ def get_alpaca_client(
     api_key: str,
     api_secret: str,
     test_id: str | None,
+    quote_ttl: float = AlpacaClient.QUOTE_TTL,
 ) -> AlpacaClient:
     client: type[AlpacaClient] = TestClient if env == Environment.TEST else LiveClient
     return client(
@@ -218,4 +331,5 @@ def get_alpaca_client(
         api_key=api_key,
         api_secret=api_secret,
         test_id=test_id,
+        quote_ttl=quote_ttl,
     )
@@ -1,9 +1,14 @@
 import time
 from uuid import uuid4
 
+import pandas as pd
 from alpaca_trade_api.entity import Order
 
 from alpaca.client import AlpacaClient
+from alpaca.frame import to_order_frame
+from alpaca.store import OrderJournal
+from alpaca.stream import TradeUpdateListener
+from alpaca.utils import to_rfc3339
 from errors import ErroredOrderState
 from stubs import OrderSide, OrderType
 
@@ -11,6 +16,15 @@ from stubs import OrderSide, OrderType
 ORDER_TIMEOUT: float = 5.0
 ORDER_POLL_INTERVAL: float = 1.0
 VALID_ORDER_STATUSES: frozenset[str] = frozenset(("filled", "canceled", "rejected"))
+ORDER_PAGE_LIMIT: int = 500
+# with the trade stream up, REST only backs it up every this many stream waits,
+# and once more before giving up on the order
+STREAM_POLL_FALLBACK: int = 3
+# orders are day orders submitted during market hours, so they fill within the
+# session they were submitted in or expire. Re-listing a day back from the latest
+# journaled submission catches orders still resting at the last sync, and
+# re-listed fills are deduped by order id
+JOURNAL_SYNC_OVERLAP: pd.Timedelta = pd.Timedelta(days=1)
 
 
 class Exchange:
@@ -20,32 +34,90 @@ class Exchange:
         name: str,
         poll_interval: float = ORDER_POLL_INTERVAL,
         timeout: float = ORDER_TIMEOUT,
+        journal: OrderJournal | None = None,
+        listener: TradeUpdateListener | None = None,
     ) -> None:
         self.client: AlpacaClient = client
         self.client_id: str = f"broker-{name}"
         self.poll_interval: float = poll_interval
         self.timeout: float = timeout
+        self.journal: OrderJournal | None = journal
+        self.listener: TradeUpdateListener | None = listener
 
     def submit_trade(
         self, symbol: str, qty: float, side: OrderSide, type: OrderType
     ) -> Order:
-        return self._try_submit_order(
+        order: Order = self._try_submit_order(
             symbol=symbol, qty=qty, side=side.to_str(), type=type.to_str()
         )
+        if self.journal is not None and order.status == "filled":
+            self.journal.put_orders([order])
+        return order
 
-    def get_filled_orders(self) -> list[Order]:
-        orders = self.client.list_orders(status="filled", nested=True)
-        return [o for o in orders if o.client_order_id.startswith(self.client_id)]
+    def get_filled_order_frame(
+        self, after: pd.Timestamp | None = None, until: pd.Timestamp | None = None
+    ) -> pd.DataFrame:
+        """This broker's filled orders, optionally restricted to [after, until)."""
+        if self.journal is None:
+            return to_order_frame(self._list_filled_orders(after=after, until=until))
+
+        self._sync_journal()
+        return self.journal.get_order_frame(after=after, until=until)
+
+    def _sync_journal(self) -> None:
+        cursor: pd.Timestamp | None = self.journal.get_cursor()
+        sync_after: pd.Timestamp | None = (
+            None if cursor is None else cursor - JOURNAL_SYNC_OVERLAP
+        )
+        self.journal.put_orders(self._list_filled_orders(after=sync_after))
+
+    def _list_filled_orders(
+        self, after: pd.Timestamp | None, until: pd.Timestamp | None = None
+    ) -> list[Order]:
+        """Pages through every filled order submitted between `after` and `until`."""
+        page_after: str | None = None if after is None else to_rfc3339(after)
+        page_until: str | None = None if until is None else to_rfc3339(until)
+        orders: list[Order] = []
+        while True:
+            page: list[Order] = self.client.list_orders(
+                status="filled",
+                nested=True,
+                after=page_after,
+                until=page_until,
+                limit=ORDER_PAGE_LIMIT,
+                direction="asc",
+            )
+            orders.extend(
+                o for o in page if o.client_order_id.startswith(self.client_id)
+            )
+            if len(page) < ORDER_PAGE_LIMIT:
+                return orders
+            # keep sub-second precision so the next page starts right after this one
+            page_after = page[-1].submitted_at.isoformat()
 
     def _check_status_periodically(self, order_id: str) -> Order | None:
         time_waited: float = 0.0
+        waits: int = 0
         while time_waited < self.timeout:
+            time_waited += self.poll_interval
+            waits += 1
+            streaming: bool = self.listener is not None and self.listener.is_running()
+            if streaming:
+                # wakes as soon as the stream reports a terminal status
+                streamed: Order | None = self.listener.wait_for_status(
+                    order_id, statuses=VALID_ORDER_STATUSES, timeout=self.poll_interval
+                )
+                if streamed is not None:
+                    return streamed
+                if waits % STREAM_POLL_FALLBACK and time_waited < self.timeout:
+                    continue
+
             order: Order = self.client.get_order(order_id)
             if order.status in VALID_ORDER_STATUSES:
                 return order
 
-            time_waited += self.poll_interval
-            time.sleep(self.poll_interval)
+            if not streaming:
+                time.sleep(self.poll_interval)
 
     def _try_submit_order(self, symbol: str, qty: float, side: str, type: str) -> Order:
         client_order_id: str = f"{self.client_id}-{str(uuid4())}"
@@ -66,7 +138,7 @@ class Exchange:
             return order
 
         # corrupted order state, cancel it instead
-        return self._try_cancel_order(order.id)
+        return self._try_cancel_order(order_id)
 
     def _try_cancel_order(self, order_id: str) -> Order:
         self.client.cancel_order(order_id)
@@ -0,0 +1,58 @@
+from typing import Iterable
+
+import pandas as pd
+from alpaca_trade_api.entity import Order
+
+from stubs import OrderSide, OrderType
+
+
+ORDER_COLUMNS: list[str] = ["timestamp", "asset", "type", "side", "qty", "price"]
+ORDER_SIDES: pd.CategoricalDtype = pd.CategoricalDtype([s.to_str() for s in OrderSide])
+ORDER_TYPES: pd.CategoricalDtype = pd.CategoricalDtype([t.to_str() for t in OrderType])
+
+
+def build_order_frame(
+    filled_at: Iterable[str],
+    symbol: Iterable[str],
+    type: Iterable[str],
+    side: Iterable[str],
+    filled_qty: Iterable[str | float],
+    filled_avg_price: Iterable[str | float],
+) -> pd.DataFrame:
+    """
+    Filled orders as one typed column per field, oldest fill first. Fields are
+    converted a column at a time, so bulk loads skip building an object per row.
+    """
+    df: pd.DataFrame = pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(
+                pd.Series(list(filled_at), dtype=object), utc=True, format="ISO8601"
+            ),
+            "asset": pd.Series(list(symbol), dtype=object),
+            "type": pd.Series(list(type), dtype=ORDER_TYPES),
+            "side": pd.Series(list(side), dtype=ORDER_SIDES),
+            "qty": pd.Series(list(filled_qty), dtype=object).astype(float),
+            "price": pd.Series(list(filled_avg_price), dtype=object).astype(float),
+        },
+        columns=ORDER_COLUMNS,
+    )
+    # values outside the categories come back as NaN rather than raising
+    for column, enum in (("type", OrderType), ("side", OrderSide)):
+        if df[column].isna().any():
+            raise ValueError(
+                f"Cannot convert column {column} into valid {enum.__name__} values"
+            )
+    return df.sort_values("timestamp", kind="stable", ignore_index=True)
+
+
+def to_order_frame(orders: list[Order]) -> pd.DataFrame:
+    """Order frame of alpaca order entities, read straight off their raw payloads."""
+    raws: list[dict] = [o._raw for o in orders]
+    return build_order_frame(
+        filled_at=(r["filled_at"] for r in raws),
+        symbol=(r["symbol"] for r in raws),
+        type=(r["type"] for r in raws),
+        side=(r["side"] for r in raws),
+        filled_qty=(r["filled_qty"] for r in raws),
+        filled_avg_price=(r["filled_avg_price"] for r in raws),
+    )
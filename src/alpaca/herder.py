@@ -1,4 +1,5 @@
 import datetime
+from concurrent.futures import Future
 
 import pandas as pd
 from alpaca_trade_api.entity import Order
@@ -16,8 +17,6 @@ from stubs import (
     GetPortfolioRequest,
     GetPortfolioResponse,
     MetricWindow,
-    OrderMetadata,
-    OrderSide,
     OrderStatus,
     OrderType,
     PositionMetadata,
@@ -28,6 +27,9 @@ from stubs import (
 )
 
 
+RENDER_TIMEOUT: int = 120
+
+
 class AlpacaHerder:
     def __init__(
         self,
@@ -71,46 +73,41 @@ class AlpacaHerder:
         )
 
     def get_orders(self, request: GetOrdersRequest) -> GetOrdersResponse:
-        filled_orders: list[Order] = self.exchange.get_filled_orders()
+        start: pd.Timestamp | None = None
         if request.window is not None and request.window != MetricWindow.TOTAL:
-            start: datetime.date = self._window_to_start(request.window)
-            filled_orders = [o for o in filled_orders if o.filled_at >= start]
-        order_metas: list[OrderMetadata] = [
-            OrderMetadata(
-                timestamp=o.filled_at,
-                asset=o.symbol,
-                type=OrderType.from_str(o.type),
-                side=OrderSide.from_str(o.side),
-                qty=float(o.filled_qty),
-                price=float(o.filled_avg_price),
-            )
-            for o in filled_orders
-        ]
-        path: str = self.visualizer.generate_orders_table(order_metas)
+            start = self._window_to_start(request.window)
+        filled_orders: pd.DataFrame = self.exchange.get_filled_order_frame(after=start)
+        rendered: Future[str] = self.visualizer.submit_orders_table(filled_orders)
+        path: str = rendered.result(timeout=RENDER_TIMEOUT)
         return GetOrdersResponse(
             success=True, message="Done fetching filled orders.", path=path
         )
 
     def get_portfolio(self, request: GetPortfolioRequest) -> GetPortfolioResponse:
-        filled_orders: list[Order] = self.exchange.get_filled_orders()
+        filled_orders: pd.DataFrame = self.exchange.get_filled_order_frame()
         positions: list[PositionMetadata] = self.ledger.get_positions(filled_orders)
-        path: str = self.visualizer.generate_portfolio_table(positions)
+        rendered: Future[str] = self.visualizer.submit_portfolio_table(positions)
+        path: str = rendered.result(timeout=RENDER_TIMEOUT)
         return GetPortfolioResponse(
             success=True, message="Done fetching portfolio positions.", path=path
         )
 
     def get_pnl(self, request: GetPnlRequest) -> GetPnlResponse:
-        filled_orders: list[Order] = self.exchange.get_filled_orders()
+        # fills before the window still hold the cost basis, so history isn't filtered
+        filled_orders: pd.DataFrame = self.exchange.get_filled_order_frame()
         total_pnl: pd.DataFrame = self.ledger.get_total_running_pnl(filled_orders)
         if request.window is not None and request.window != MetricWindow.TOTAL:
-            start: datetime.date = self._window_to_start(request.window)
+            start: pd.Timestamp = self._window_to_start(request.window)
             total_pnl = self._root_pnl(total_pnl, start)
-        import pdb
-
-        pdb.set_trace()
-        path: str = self.visualizer.generate_pnl_plot(total_pnl, request.window)
+        rendered: Future[str] = self.visualizer.submit_pnl_plot(
+            total_pnl, request.window
+        )
+        path: str = rendered.result(timeout=RENDER_TIMEOUT)
         return GetPnlResponse(success=True, message="Done calculating PnL.", path=path)
 
+    def shutdown(self) -> None:
+        self.visualizer.shutdown()
+
     def _validate_trade_request(self, request: SubmitTradeRequest) -> None:
         if self.env == Environment.TEST:
             # pass through all requests to test client
@@ -149,8 +146,8 @@ class AlpacaHerder:
                 raise ValueError(f"Unexpected order status: {status.name}")
 
     @staticmethod
-    def _window_to_start(window: MetricWindow) -> datetime.date:
-        now: datetime.date = datetime.datetime.now().date()
+    def _window_to_start(window: MetricWindow) -> pd.Timestamp:
+        now: pd.Timestamp = pd.Timestamp.now(tz="America/New_York").normalize()
         match window:
             case MetricWindow.DAILY:
                 return now
@@ -162,10 +159,10 @@ class AlpacaHerder:
                 raise ValueError(f"Unexpected metric window: {window.name}")
 
     @staticmethod
-    def _root_pnl(df: pd.DataFrame, start: datetime.date) -> pd.DataFrame:
+    def _root_pnl(df: pd.DataFrame, start: pd.Timestamp) -> pd.DataFrame:
         prev = df[df["timestamp"] < start]
         starting_pnl: float = 0.0 if prev.empty else prev.iloc[-1]["total_pnl"]
 
-        df = df[df["timestamp"] >= start]
+        df = df[df["timestamp"] >= start].copy()
         df["total_pnl"] = df["total_pnl"] - starting_pnl
         return df
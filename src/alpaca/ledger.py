@@ -1,184 +1,312 @@
 import datetime
-from collections import defaultdict, deque
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 
+import numpy as np
 import pandas as pd
-from alpaca_trade_api.entity import Order
 from alpaca_trade_api.entity_v2 import BarsV2, QuoteV2
 
 from alpaca.client import AlpacaClient
-from alpaca.utils import MKT_CLOSE, MKT_OPEN, is_mkt_open
-from stubs import OrderSide, PositionMetadata, PositionSide
+from alpaca.lots import LotEngine
+from alpaca.store import BarStore
+from alpaca.utils import MKT_CLOSE, MKT_OPEN, mkt_open_mask, to_rfc3339
+from stubs import PositionMetadata, PositionSide
 
 
-class Ledger:
-    def __init__(self, client: AlpacaClient) -> None:
-        self.client: AlpacaClient = client
+PNL_COLUMNS: list[str] = ["timestamp", "realized_pnl", "unrealized_pnl", "total_pnl"]
+BAR_FETCH_WORKERS: int = 4
+MAX_SYMBOLS_PER_REQUEST: int = 100
+MULTI_SYMBOL_PAGE_LIMIT: int = 10000
+# tails starting further apart than this aren't worth over-fetching to share a request
+MULTI_SYMBOL_SLACK: pd.Timedelta = pd.Timedelta(days=1)
 
-    def get_positions(self, filled_orders: list[Order]) -> list[PositionMetadata]:
-        positions: list[PositionMetadata] = []
 
-        sym_to_orders: dict[str, list[Order]] = defaultdict(list)
-        sym_to_price: dict[str, float] = {}
-        for o in filled_orders:
-            if o.symbol not in sym_to_price:
-                quote: QuoteV2 = self.client.get_quote(o.symbol)
-                sym_to_price[o.symbol] = quote.ap
-            sym_to_orders[o.symbol].append(o)
-
-        for sym, orders in sym_to_orders.items():
-            fifo_lots: deque[tuple[float, float]] = deque()
-            net_qty = 0.0
-
-            for o in sorted(orders, key=lambda o: o.filled_at):
-                qty = float(o.filled_qty)
-                price = float(o.filled_avg_price)
-
-                if o.side == "buy":
-                    fifo_lots.append((qty, price))
-                    net_qty += qty
-                elif o.side == "sell":
-                    net_qty -= qty
-                    while qty > 0 and fifo_lots:
-                        lot_qty, lot_price = fifo_lots.popleft()
-                        if lot_qty > qty:
-                            fifo_lots.appendleft((lot_qty - qty, lot_price))
-                            qty = 0
-                        else:
-                            qty -= lot_qty
-
-            remaining_lots = list(fifo_lots)
-            remaining_qty: float = sum(q for q, _ in remaining_lots)
-            cost_basis: float = sum(q * p for q, p in remaining_lots)
-            avg_entry_price: float = (
-                cost_basis / remaining_qty if remaining_qty else 0.0
-            )
+@dataclass(kw_only=True, frozen=True)
+class BarFetchJob:
+    symbols: tuple[str, ...]
+    start: pd.Timestamp
+    end: pd.Timestamp
+
 
-            price: float = sym_to_price[sym]
-            market_value: float = remaining_qty * price
-            unrealized_pnl: float = market_value - cost_basis
+@dataclass(kw_only=True)
+class BarChunk:
+    """All bars for symbol in [start, end)."""
+
+    symbol: str
+    start: pd.Timestamp
+    end: pd.Timestamp
+    bars_df: pd.DataFrame
+
+
+class Ledger:
+    def __init__(
+        self,
+        client: AlpacaClient,
+        bar_store: BarStore | None = None,
+        fetch_workers: int = BAR_FETCH_WORKERS,
+    ) -> None:
+        self.client: AlpacaClient = client
+        self.bar_store: BarStore | None = bar_store
+        self.fetch_workers: int = fetch_workers
+        self.lots: LotEngine = LotEngine()
 
+    def get_positions(self, orders: pd.DataFrame) -> list[PositionMetadata]:
+        """Open positions of an order frame, valued at the current ask."""
+        books: dict[str, tuple[float, float, float]] = self.lots.get_books(orders)
+        quotes: dict[str, QuoteV2] = self.client.get_quotes(list(books))
+
+        positions: list[PositionMetadata] = []
+        for sym, (qty, cost_basis, _) in books.items():
+            price: float = quotes[sym].ap
+            # shorts carry negative qty, cost basis and market value
+            market_value: float = qty * price
             positions.append(
                 PositionMetadata(
                     asset=sym,
-                    qty=remaining_qty,
-                    side=PositionSide.SHORT if net_qty < 0 else PositionSide.LONG,
-                    avg_entry_price=avg_entry_price,
+                    qty=abs(qty),
+                    side=PositionSide.SHORT if qty < 0 else PositionSide.LONG,
+                    avg_entry_price=cost_basis / qty if qty else 0.0,
                     current_price=price,
                     cost_basis=cost_basis,
                     market_value=market_value,
-                    unrealized_pnl=unrealized_pnl,
+                    unrealized_pnl=market_value - cost_basis,
                 )
             )
 
         return positions
 
-    def get_total_running_pnl(self, filled_orders: list[Order]) -> pd.DataFrame:
-        if not filled_orders:
-            return pd.DataFrame(
-                columns=["timestamp", "realized_pnl", "unrealized_pnl", "total_pnl"]
+    def get_total_running_pnl(
+        self, orders: pd.DataFrame, now: pd.Timestamp | None = None
+    ) -> pd.DataFrame:
+        """Pnl at every market minute from the first fill up to now."""
+        if orders.empty:
+            return pd.DataFrame(columns=PNL_COLUMNS)
+
+        mkt_price: dict[str, pd.Series] = self._get_bars(orders)
+
+        if now is None:
+            now = pd.Timestamp.now(tz=datetime.timezone.utc)
+        end: pd.Timestamp = now.floor("min")
+        fill_times: pd.DatetimeIndex = pd.DatetimeIndex(orders["timestamp"]).floor(
+            "min"
+        )
+        start: pd.Timestamp = min(fill_times.min(), end)
+        minutes: pd.DatetimeIndex = pd.date_range(
+            start=start, end=end, freq="1min", tz=datetime.timezone.utc
+        )
+        timeline: pd.DatetimeIndex = minutes[mkt_open_mask(minutes)]
+        minute_idx: np.ndarray = np.arange(len(timeline))
+
+        # fills outside market hours take effect from the next open minute
+        fill_idx: np.ndarray = timeline.searchsorted(fill_times)
+
+        realized_after, sym_states = self.lots.get_history(orders)
+
+        # realized pnl at each minute is the running total after its last fill
+        last_fill: np.ndarray = np.searchsorted(fill_idx, minute_idx, side="right")
+        realized_pnl: np.ndarray = np.concatenate(([0.0], realized_after))[last_fill]
+
+        unrealized_pnl: np.ndarray = np.zeros(len(timeline))
+        for symbol, (fills, qty, cost) in sym_states.items():
+            # prefixed with the flat pre-trade state, so searchsorted can index it
+            qty = np.concatenate(([0.0], qty))
+            cost = np.concatenate(([0.0], cost))
+            state: np.ndarray = np.searchsorted(
+                fill_idx[fills], minute_idx, side="right"
             )
-
-        mkt_price: dict[str, dict[pd.Timestamp, float]] = self._get_bars(filled_orders)
-
-        start = end = pd.Timestamp.now(tz=datetime.timezone.utc).floor("min")
-        ts_to_orders: dict[pd.Timestamp, list[Order]] = defaultdict(list)
-        for o in filled_orders:
-            fill_time: pd.Timestamp = o.filled_at.floor("min")
-            start = min(fill_time, start)
-            ts_to_orders[fill_time].append(o)
-
-        position_lots: dict[str, deque[tuple[float, float]]] = defaultdict(deque)
-        net_positions: dict[str, int] = defaultdict(int)
-        realized_pnl: float = 0.0
-
-        pnl_snapshots = []
-        timeline: list[pd.Timestamp] = [
-            ts
-            for ts in pd.date_range(
-                start=start, end=end, freq="1min", tz=datetime.timezone.utc
+            price: np.ndarray = (
+                mkt_price[symbol].reindex(timeline).to_numpy(dtype=float)
             )
-            if is_mkt_open(ts)
-        ]
-        for timestamp in timeline:
-            for order in ts_to_orders[timestamp]:
-                symbol = order.symbol
-                qty: float = float(order.filled_qty)
-                price: float = float(order.filled_avg_price)
-                side: OrderSide = OrderSide.from_str(order.side)
-
-                if side == OrderSide.BUY:
-                    position_lots[symbol].append((qty, price))
-                    net_positions[symbol] += qty
-                elif side == OrderSide.SELL:
-                    qty_to_sell: float = qty
-                    while qty_to_sell > 0 and position_lots[symbol]:
-                        lot_qty, lot_price = position_lots[symbol].popleft()
-                        matched_qty = min(qty_to_sell, lot_qty)
-                        pnl = matched_qty * (price - lot_price)
-                        realized_pnl += pnl
-                        qty_to_sell -= matched_qty
-                        if lot_qty > matched_qty:
-                            position_lots[symbol].appendleft(
-                                (lot_qty - matched_qty, lot_price)
-                            )
-                    net_positions[symbol] -= qty
-
-            unrealized_pnl: float = 0.0
-            for symbol, lots in position_lots.items():
-                market_price = mkt_price[symbol][timestamp]
-                for qty, entry_price in lots:
-                    unrealized_pnl += qty * (market_price - entry_price)
-
-            total_pnl = realized_pnl + unrealized_pnl
-            pnl_snapshots.append(
-                {
-                    "timestamp": timestamp,
-                    "realized_pnl": realized_pnl,
-                    "unrealized_pnl": unrealized_pnl,
-                    "total_pnl": total_pnl,
-                }
+            unrealized_pnl += np.where(
+                qty[state] != 0, qty[state] * price - cost[state], 0.0
             )
 
-        return pd.DataFrame(pnl_snapshots)
+        return pd.DataFrame(
+            {
+                "timestamp": timeline,
+                "realized_pnl": realized_pnl,
+                "unrealized_pnl": unrealized_pnl,
+                "total_pnl": realized_pnl + unrealized_pnl,
+            }
+        )
+
+    def _get_bars(self, orders: pd.DataFrame) -> dict[str, pd.Series]:
+        sym_to_start: dict[str, pd.Timestamp] = (
+            orders.groupby("asset", sort=False)["timestamp"].min().dt.floor("min")
+        ).to_dict()
+
+        end: pd.Timestamp = pd.Timestamp.now(tz=datetime.timezone.utc)
+        sym_to_gaps: dict[str, list[tuple[pd.Timestamp, pd.Timestamp]]] = {
+            sym: (
+                [(start, end)]
+                if self.bar_store is None
+                # only hit the API for minutes the store hasn't seen yet
+                else self.bar_store.get_missing_ranges(sym, start=start, end=end)
+            )
+            for sym, start in sym_to_start.items()
+        }
+        chunks: list[BarChunk] = self._fetch_all_bars(sym_to_gaps, end=end)
 
-    def _get_bars(self, orders: list[Order]) -> dict[str, dict[pd.Timestamp, float]]:
-        sym_to_start: dict[str, pd.Timestamp] = {}
-        for o in orders:
-            if (o.symbol not in sym_to_start) or o.filled_at < sym_to_start[o.symbol]:
-                sym_to_start[o.symbol] = o.filled_at
+        if self.bar_store is not None:
+            for chunk in chunks:
+                self.bar_store.put_bars(
+                    chunk.symbol, chunk.bars_df, start=chunk.start, end=chunk.end
+                )
+            sym_to_bars: dict[str, pd.DataFrame] = {
+                sym: self.bar_store.get_bars(sym, start=start, end=end)
+                for sym, start in sym_to_start.items()
+            }
+            # only evict once every symbol of this request has been read back
+            self.bar_store.evict(keep=set(sym_to_start))
+        else:
+            sym_to_chunks: dict[str, list[pd.DataFrame]] = defaultdict(list)
+            for chunk in chunks:
+                sym_to_chunks[chunk.symbol].append(chunk.bars_df)
+            sym_to_bars = {
+                sym: (
+                    pd.concat(sym_to_chunks[sym]).sort_index().loc[start:]
+                    if sym_to_chunks[sym]
+                    else pd.DataFrame(columns=["close"])
+                )
+                for sym, start in sym_to_start.items()
+            }
 
         return {
-            sym: self._get_bars_for_symbol(symbol=sym, start=start)
-            for sym, start in sym_to_start.items()
+            sym: (
+                pd.Series(dtype=float)
+                if bars_df.empty
+                else self._map_ts_to_price(bars_df)
+            )
+            for sym, bars_df in sym_to_bars.items()
         }
 
-    def _get_bars_for_symbol(
-        self, symbol: str, start: pd.Timestamp
-    ) -> dict[pd.Timestamp, float]:
-        bars_data: list[pd.DataFrame] = []
+    def _fetch_all_bars(
+        self,
+        sym_to_gaps: dict[str, list[tuple[pd.Timestamp, pd.Timestamp]]],
+        end: pd.Timestamp,
+    ) -> list[BarChunk]:
+        jobs: list[BarFetchJob] = self._plan_bar_jobs(sym_to_gaps, end=end)
+        chunks: list[BarChunk] = []
+        if not jobs:
+            return chunks
+
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as pool:
+            pending: set[Future] = {pool.submit(self._run_bar_job, j) for j in jobs}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_chunks, leftover_jobs = future.result()
+                    chunks.extend(job_chunks)
+                    pending |= {
+                        pool.submit(self._run_bar_job, j) for j in leftover_jobs
+                    }
+
+        return chunks
 
-        cur_start: pd.Timestamp = start
-        end: pd.Timestamp = pd.Timestamp.now(tz="America/New_York")
-        while cur_start < end:
-            # Format RFC3339
-            start_ts: str = (
-                cur_start.astimezone(datetime.timezone.utc)
-                .replace(microsecond=0)
-                .isoformat()
-                .replace("+00:00", "Z")
+    @staticmethod
+    def _plan_bar_jobs(
+        sym_to_gaps: dict[str, list[tuple[pd.Timestamp, pd.Timestamp]]],
+        end: pd.Timestamp,
+    ) -> list[BarFetchJob]:
+        """
+        Gaps running up to now with nearby starts are batched into multi-symbol
+        jobs, everything else is fetched one symbol at a time.
+        """
+        jobs: list[BarFetchJob] = []
+        tails: list[tuple[pd.Timestamp, str]] = []
+        for sym, gaps in sym_to_gaps.items():
+            for start, gap_end in gaps:
+                if gap_end == end:
+                    tails.append((start, sym))
+                else:
+                    jobs.append(BarFetchJob(symbols=(sym,), start=start, end=gap_end))
+
+        batch: list[str] = []
+        batch_start: pd.Timestamp | None = None
+        for start, sym in sorted(tails):
+            if batch and (
+                start - batch_start > MULTI_SYMBOL_SLACK
+                or len(batch) >= MAX_SYMBOLS_PER_REQUEST
+            ):
+                jobs.append(
+                    BarFetchJob(symbols=tuple(batch), start=batch_start, end=end)
+                )
+                batch = []
+            if not batch:
+                batch_start = start
+            batch.append(sym)
+        if batch:
+            jobs.append(BarFetchJob(symbols=tuple(batch), start=batch_start, end=end))
+
+        return jobs
+
+    def _run_bar_job(
+        self, job: BarFetchJob
+    ) -> tuple[list[BarChunk], list[BarFetchJob]]:
+        if len(job.symbols) == 1:
+            symbol: str = job.symbols[0]
+            bars_df: pd.DataFrame = self._fetch_bars(
+                symbol, start=job.start, end=job.end
             )
-            end_ts: str = (
-                end.astimezone(datetime.timezone.utc)
-                .replace(microsecond=0)
-                .isoformat()
-                .replace("+00:00", "Z")
+            chunk = BarChunk(
+                symbol=symbol, start=job.start, end=job.end, bars_df=bars_df
             )
+            return [chunk], []
+
+        df: pd.DataFrame = self.client.get_bars(
+            symbol=list(job.symbols),
+            timeframe="1Min",
+            start=to_rfc3339(job.start),
+            end=to_rfc3339(job.end),
+            limit=MULTI_SYMBOL_PAGE_LIMIT,
+        ).df
+        sym_to_df: dict[str, pd.DataFrame] = (
+            {} if df.empty else dict(tuple(df.sort_index().groupby("symbol")))
+        )
+
+        # a short page holds everything. On a full page bars come back grouped by
+        # symbol, so only symbols up to the last one returned are complete
+        if len(df) < MULTI_SYMBOL_PAGE_LIMIT:
+            last_sym: str | None = None
+        else:
+            last_sym = df["symbol"].iloc[-1]
+
+        chunks: list[BarChunk] = []
+        leftover_jobs: list[BarFetchJob] = []
+        for sym in sorted(job.symbols):
+            sym_df: pd.DataFrame = sym_to_df.get(sym, pd.DataFrame(columns=["close"]))
+            if last_sym is None or sym < last_sym:
+                chunks.append(
+                    BarChunk(symbol=sym, start=job.start, end=job.end, bars_df=sym_df)
+                )
+            elif sym == last_sym:
+                resume: pd.Timestamp = sym_df.index[-1] + pd.Timedelta(minutes=1)
+                chunks.append(
+                    BarChunk(symbol=sym, start=job.start, end=resume, bars_df=sym_df)
+                )
+                leftover_jobs.append(
+                    BarFetchJob(symbols=(sym,), start=resume, end=job.end)
+                )
+            else:
+                leftover_jobs.append(
+                    BarFetchJob(symbols=(sym,), start=job.start, end=job.end)
+                )
+
+        return chunks, leftover_jobs
 
+    def _fetch_bars(
+        self, symbol: str, start: pd.Timestamp, end: pd.Timestamp
+    ) -> pd.DataFrame:
+        bars_data: list[pd.DataFrame] = []
+
+        cur_start: pd.Timestamp = start
+        while cur_start < end:
             bars: BarsV2 = self.client.get_bars(
                 symbol=symbol,
                 timeframe="1Min",
-                start=start_ts,
-                end=end_ts,
+                start=to_rfc3339(cur_start),
+                end=to_rfc3339(end),
                 limit=1000,
             )
 
@@ -193,13 +321,12 @@ class Ledger:
             cur_start = last_ts + pd.Timedelta(minutes=1)
 
         if not bars_data:
-            return {}
+            return pd.DataFrame(columns=["close"])
 
-        bars_df = pd.concat(bars_data)
-        return self._map_ts_to_price(bars_df)
+        return pd.concat(bars_data)
 
     @staticmethod
-    def _map_ts_to_price(bars_df: pd.DataFrame) -> dict[pd.Timestamp, float]:
+    def _map_ts_to_price(bars_df: pd.DataFrame) -> pd.Series:
         bars_df = bars_df.sort_index()
         full_index = []
 
@@ -212,4 +339,4 @@ class Ledger:
         bars_df = bars_df.reindex(full_index)
         bars_df["close"] = bars_df["close"].ffill()
 
-        return bars_df["close"].to_dict()
+        return bars_df["close"]
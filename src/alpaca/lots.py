@@ -0,0 +1,158 @@
+import threading
+from collections import defaultdict, deque
+
+import numpy as np
+import pandas as pd
+
+from alpaca.frame import ORDER_COLUMNS
+
+
+# fractional fills don't sum exactly, e.g. 0.3 - 0.1 - 0.1 - 0.1 leaves -2.8e-17,
+# so quantities within this of zero count as closed
+QTY_EPSILON: float = 1e-9
+
+
+class Lot:
+    __slots__ = ("qty", "price")
+
+    def __init__(self, qty: float, price: float) -> None:
+        self.qty: float = qty
+        self.price: float = price
+
+
+class LotBook:
+    """
+    Open FIFO lots of one symbol. Lots all face the same way, so qty and cost are
+    signed: positive while long, negative while short.
+    """
+
+    __slots__ = ("lots", "qty", "cost", "realized")
+
+    def __init__(self) -> None:
+        self.lots: deque[Lot] = deque()
+        self.qty: float = 0.0
+        self.cost: float = 0.0
+        self.realized: float = 0.0
+
+    def apply(self, qty: float, price: float) -> float:
+        """Applies a fill of signed qty (negative for sells), returning realized pnl."""
+        direction: float = 1.0 if qty > 0 else -1.0
+        remaining: float = abs(qty)
+        realized: float = 0.0
+
+        # fills against the open side close the oldest lots first
+        while remaining > QTY_EPSILON and self.lots and self.qty * direction < 0:
+            lot: Lot = self.lots[0]
+            matched: float = min(remaining, lot.qty)
+            realized -= direction * matched * (price - lot.price)
+            self.qty += direction * matched
+            self.cost += direction * matched * lot.price
+            lot.qty -= matched
+            remaining -= matched
+            if lot.qty <= QTY_EPSILON:
+                self.lots.popleft()
+        if not self.lots:
+            # drop float residue once flat
+            self.qty = self.cost = 0.0
+
+        # whatever is left over opens a lot, flipping the position if it was closed
+        if remaining > QTY_EPSILON:
+            self.lots.append(Lot(remaining, price))
+            self.qty += direction * remaining
+            self.cost += direction * remaining * price
+
+        self.realized += realized
+        return realized
+
+
+class LotEngine:
+    """
+    Lot accounting over an order frame, applied one fill at a time. Each fill
+    is O(1) amortized, since it opens at most one lot and every lot closes once.
+    After every fill the engine records the symbol's open qty and cost and the
+    total realized pnl, so state is available at any point in the history.
+
+    Each read first syncs the engine with the frame it's given, applying only
+    fills it hasn't seen yet. The frame's row hashes are compared against the
+    fills already applied, and if earlier fills changed (e.g. a late fill landed
+    in the middle of the history) the engine replays from scratch.
+    """
+
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.books: dict[str, LotBook] = defaultdict(LotBook)
+        self.realized: float = 0.0
+        self.row_hashes: np.ndarray = np.empty(0, dtype=np.uint64)
+        self.qty_after: list[float] = []
+        self.cost_after: list[float] = []
+        self.realized_after: list[float] = []
+        self.sym_fills: dict[str, list[int]] = defaultdict(list)
+
+    def get_books(self, orders: pd.DataFrame) -> dict[str, tuple[float, float, float]]:
+        """
+        Per symbol, the open qty and cost basis (both signed) and realized pnl at
+        the end of a fill-time sorted order frame.
+        """
+        row_hashes: np.ndarray = self._hash_rows(orders)
+        with self.lock:
+            self._sync(orders, row_hashes)
+            return {
+                sym: (book.qty, book.cost, book.realized)
+                for sym, book in self.books.items()
+            }
+
+    def get_history(
+        self, orders: pd.DataFrame
+    ) -> tuple[np.ndarray, dict[str, tuple[np.ndarray, np.ndarray, np.ndarray]]]:
+        """
+        Total realized pnl after each fill of a fill-time sorted order frame, and
+        per symbol the positions of its fills in the frame alongside its open qty
+        and cost after each of them.
+        """
+        row_hashes: np.ndarray = self._hash_rows(orders)
+        # synced and read under one hold, so another frame can't replace the
+        # history before it's taken
+        with self.lock:
+            self._sync(orders, row_hashes)
+            qty_after: np.ndarray = np.asarray(self.qty_after)
+            cost_after: np.ndarray = np.asarray(self.cost_after)
+            sym_states: dict[str, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+            for sym, fills in self.sym_fills.items():
+                idx: np.ndarray = np.asarray(fills, dtype=np.int64)
+                sym_states[sym] = (idx, qty_after[idx], cost_after[idx])
+            return np.asarray(self.realized_after), sym_states
+
+    @staticmethod
+    def _hash_rows(orders: pd.DataFrame) -> np.ndarray:
+        return pd.util.hash_pandas_object(orders[ORDER_COLUMNS], index=False).to_numpy()
+
+    def _sync(self, orders: pd.DataFrame, row_hashes: np.ndarray) -> None:
+        """Brings the engine up to date with the order frame. Needs the lock held."""
+        num_applied: int = len(self.row_hashes)
+        if num_applied > len(row_hashes) or not np.array_equal(
+            self.row_hashes, row_hashes[:num_applied]
+        ):
+            self._reset()
+            num_applied = 0
+
+        new: pd.DataFrame = orders.iloc[num_applied:]
+        fills = zip(
+            new["asset"].to_numpy(),
+            new["side"].to_numpy(),
+            new["qty"].to_numpy(),
+            new["price"].to_numpy(),
+        )
+        for symbol, side, qty, price in fills:
+            self._apply(symbol, qty if side == "buy" else -qty, price)
+        self.row_hashes = row_hashes
+
+    def _apply(self, symbol: str, qty: float, price: float) -> None:
+        book: LotBook = self.books[symbol]
+        self.realized += book.apply(qty, price)
+        self.sym_fills[symbol].append(len(self.qty_after))
+        self.qty_after.append(book.qty)
+        self.cost_after.append(book.cost)
+        self.realized_after.append(self.realized)
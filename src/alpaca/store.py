@@ -0,0 +1,295 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+from alpaca_trade_api.entity import Order
+
+from alpaca.frame import ORDER_COLUMNS, build_order_frame
+
+
+DB_PATH_ROOT: Path = Path.cwd().parent / "sqlite"
+BAR_STORE_DB: str = "bars.db"
+MAX_CACHED_BARS: int = 2_000_000
+# freshly closed minutes may still be amended upstream, so they're never marked covered
+BAR_SETTLE_TIME: pd.Timedelta = pd.Timedelta(minutes=15)
+
+
+class BarStore:
+    CREATE_BARS_TABLE: str = """
+        CREATE TABLE IF NOT EXISTS bars (
+            symbol TEXT,
+            ts INTEGER,
+            close REAL,
+            PRIMARY KEY (symbol, ts)
+        ) WITHOUT ROWID
+    """
+    CREATE_RANGES_TABLE: str = """
+        CREATE TABLE IF NOT EXISTS bar_ranges (
+            symbol TEXT,
+            start INTEGER,
+            end INTEGER
+        )
+    """
+    CREATE_SYMBOLS_TABLE: str = """
+        CREATE TABLE IF NOT EXISTS bar_symbols (
+            symbol TEXT PRIMARY KEY,
+            num_bars INTEGER,
+            last_access REAL
+        )
+    """
+    CREATE_RANGES_INDEX: str = (
+        "CREATE INDEX IF NOT EXISTS bar_ranges_symbol ON bar_ranges (symbol)"
+    )
+    INSERT_BARS: str = (
+        "INSERT OR REPLACE INTO bars (symbol, ts, close) VALUES (?, ?, ?)"
+    )
+    GET_BARS: str = (
+        "SELECT ts, close FROM bars WHERE symbol = ? AND ts >= ? AND ts < ? ORDER BY ts"
+    )
+    GET_RANGES: str = (
+        "SELECT start, end FROM bar_ranges WHERE symbol = ? ORDER BY start"
+    )
+    INSERT_RANGE: str = "INSERT INTO bar_ranges (symbol, start, end) VALUES (?, ?, ?)"
+    UPSERT_SYMBOL: str = """
+        INSERT INTO bar_symbols (symbol, num_bars, last_access)
+        VALUES (?, (SELECT COUNT(*) FROM bars WHERE symbol = ?), ?)
+        ON CONFLICT (symbol) DO UPDATE SET
+            num_bars = excluded.num_bars,
+            last_access = excluded.last_access
+    """
+    TOUCH_SYMBOL: str = "UPDATE bar_symbols SET last_access = ? WHERE symbol = ?"
+    TOTAL_BARS: str = "SELECT COALESCE(SUM(num_bars), 0) FROM bar_symbols"
+    COLDEST_SYMBOLS: str = (
+        "SELECT symbol, num_bars FROM bar_symbols ORDER BY last_access ASC"
+    )
+    DELETE_BARS: str = "DELETE FROM bars WHERE symbol = ?"
+    DELETE_RANGES: str = "DELETE FROM bar_ranges WHERE symbol = ?"
+    DELETE_SYMBOL: str = "DELETE FROM bar_symbols WHERE symbol = ?"
+
+    def __init__(
+        self, db_path: Path | None = None, max_bars: int = MAX_CACHED_BARS
+    ) -> None:
+        if db_path is None:
+            if not DB_PATH_ROOT.exists():
+                DB_PATH_ROOT.mkdir(parents=True)
+            db_path = DB_PATH_ROOT / BAR_STORE_DB
+        self.max_bars: int = max_bars
+        # requests dispatched from different threads share the store, one at a time
+        self.conn: sqlite3.Connection = sqlite3.connect(
+            db_path, check_same_thread=False
+        )
+        self.lock: threading.Lock = threading.Lock()
+        with self.conn:
+            self.conn.execute(self.CREATE_BARS_TABLE)
+            self.conn.execute(self.CREATE_RANGES_TABLE)
+            self.conn.execute(self.CREATE_SYMBOLS_TABLE)
+            self.conn.execute(self.CREATE_RANGES_INDEX)
+
+    def get_missing_ranges(
+        self, symbol: str, start: pd.Timestamp, end: pd.Timestamp
+    ) -> list[tuple[pd.Timestamp, pd.Timestamp]]:
+        """Sub-ranges of [start, end) that haven't been fetched for symbol yet."""
+        with self.lock:
+            ranges: list[tuple[int, int]] = self._get_ranges(symbol)
+
+        gaps: list[tuple[pd.Timestamp, pd.Timestamp]] = []
+        cur: pd.Timestamp = start
+        for covered in ranges:
+            covered_start, covered_end = map(self._from_epoch, covered)
+            if covered_end <= cur:
+                continue
+            if covered_start >= end:
+                break
+            if covered_start > cur:
+                gaps.append((cur, covered_start))
+            cur = max(cur, covered_end)
+        if cur < end:
+            gaps.append((cur, end))
+
+        return gaps
+
+    def get_bars(
+        self, symbol: str, start: pd.Timestamp, end: pd.Timestamp
+    ) -> pd.DataFrame:
+        with self.lock:
+            cur: sqlite3.Cursor = self.conn.execute(
+                self.GET_BARS, (symbol, self._to_epoch(start), self._to_epoch(end))
+            )
+            rows: list[tuple[int, float]] = cur.fetchall()
+            with self.conn:
+                self.conn.execute(self.TOUCH_SYMBOL, (time.time(), symbol))
+
+        df: pd.DataFrame = pd.DataFrame(rows, columns=["timestamp", "close"])
+        df.index = pd.to_datetime(df.pop("timestamp"), unit="s", utc=True)
+        df.index.name = None
+        return df
+
+    def put_bars(
+        self,
+        symbol: str,
+        bars_df: pd.DataFrame,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+    ) -> None:
+        """
+        Stores fetched bars and marks [start, end) as covered for symbol, minus
+        the most recent minutes which are left to be re-fetched on the next call.
+        The store may grow past max_bars until `evict` is called.
+        """
+        covered_end: pd.Timestamp = min(
+            end, pd.Timestamp.now(tz="UTC").floor("min") - BAR_SETTLE_TIME
+        )
+        rows: list[tuple[str, int, float]] = [
+            (symbol, self._to_epoch(ts), float(close))
+            for ts, close in bars_df["close"].items()
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany(self.INSERT_BARS, rows)
+            if start < covered_end:
+                self._add_range(symbol, start, covered_end)
+            self.conn.execute(self.UPSERT_SYMBOL, (symbol, symbol, time.time()))
+
+    def evict(self, keep: set[str]) -> None:
+        """Drops the least recently read symbols, other than keep, down to max_bars."""
+        with self.lock:
+            total: int = self.conn.execute(self.TOTAL_BARS).fetchone()[0]
+            if total <= self.max_bars:
+                return
+
+            with self.conn:
+                coldest: list[tuple[str, int]] = self.conn.execute(
+                    self.COLDEST_SYMBOLS
+                ).fetchall()
+                for symbol, num_bars in coldest:
+                    if total <= self.max_bars:
+                        break
+                    if symbol in keep:
+                        continue
+                    self.conn.execute(self.DELETE_BARS, (symbol,))
+                    self.conn.execute(self.DELETE_RANGES, (symbol,))
+                    self.conn.execute(self.DELETE_SYMBOL, (symbol,))
+                    total -= num_bars
+
+    def _get_ranges(self, symbol: str) -> list[tuple[int, int]]:
+        cur: sqlite3.Cursor = self.conn.execute(self.GET_RANGES, (symbol,))
+        return cur.fetchall()
+
+    def _add_range(self, symbol: str, start: pd.Timestamp, end: pd.Timestamp) -> None:
+        ranges: list[tuple[int, int]] = sorted(
+            self._get_ranges(symbol) + [(self._to_epoch(start), self._to_epoch(end))]
+        )
+        merged: list[list[int]] = []
+        for s, e in ranges:
+            if merged and s <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], e)
+            else:
+                merged.append([s, e])
+
+        self.conn.execute(self.DELETE_RANGES, (symbol,))
+        self.conn.executemany(self.INSERT_RANGE, [(symbol, s, e) for s, e in merged])
+
+    @staticmethod
+    def _to_epoch(ts: pd.Timestamp) -> int:
+        return int(ts.timestamp())
+
+    @staticmethod
+    def _from_epoch(epoch: int) -> pd.Timestamp:
+        return pd.Timestamp(epoch, unit="s", tz="UTC")
+
+
+class OrderJournal:
+    CREATE_TABLE: str = """
+        CREATE TABLE IF NOT EXISTS fills (
+            id TEXT PRIMARY KEY,
+            client_order_id TEXT,
+            filled_at REAL,
+            raw TEXT
+        )
+    """
+    CREATE_INDEX: str = (
+        "CREATE INDEX IF NOT EXISTS fills_filled_at ON fills (filled_at)"
+    )
+    PUT_FILL: str = """
+        INSERT OR REPLACE INTO fills (id, client_order_id, filled_at, raw)
+        VALUES (?, ?, ?, ?)
+    """
+    # pulls just the fields the order frame needs, so rows aren't json decoded here
+    GET_FILL_COLUMNS: str = """
+        SELECT
+            json_extract(raw, '$.filled_at'),
+            json_extract(raw, '$.symbol'),
+            json_extract(raw, '$.type'),
+            json_extract(raw, '$.side'),
+            json_extract(raw, '$.filled_qty'),
+            json_extract(raw, '$.filled_avg_price')
+        FROM fills WHERE filled_at >= ? AND filled_at < ? ORDER BY filled_at
+    """
+    # alpaca filters listed orders on submission time, so that's what syncs resume from
+    CREATE_SUBMITTED_INDEX: str = """
+        CREATE INDEX IF NOT EXISTS fills_submitted_at
+        ON fills (julianday(json_extract(raw, '$.submitted_at')))
+    """
+    GET_CURSOR: str = """
+        SELECT json_extract(raw, '$.submitted_at') FROM fills
+        ORDER BY julianday(json_extract(raw, '$.submitted_at')) DESC LIMIT 1
+    """
+
+    def __init__(self, name: str, db_path: Path | None = None) -> None:
+        if db_path is None:
+            if not DB_PATH_ROOT.exists():
+                DB_PATH_ROOT.mkdir(parents=True)
+            db_path = DB_PATH_ROOT / f"journal-{name}.db"
+        # synced and read from whichever worker thread is serving the request
+        self.conn: sqlite3.Connection = sqlite3.connect(
+            db_path, check_same_thread=False
+        )
+        self.lock: threading.Lock = threading.Lock()
+        with self.conn:
+            self.conn.execute(self.CREATE_TABLE)
+            self.conn.execute(self.CREATE_INDEX)
+            self.conn.execute(self.CREATE_SUBMITTED_INDEX)
+
+    def get_cursor(self) -> pd.Timestamp | None:
+        """Submission time of the most recently submitted journaled order."""
+        with self.lock:
+            row: tuple[str] | None = self.conn.execute(self.GET_CURSOR).fetchone()
+        if row is None:
+            return None
+        return pd.Timestamp(row[0]).tz_convert("UTC")
+
+    def get_order_frame(
+        self, after: pd.Timestamp | None = None, until: pd.Timestamp | None = None
+    ) -> pd.DataFrame:
+        """Journaled fills with after <= filled_at < until, oldest first."""
+        with self.lock:
+            cur: sqlite3.Cursor = self.conn.execute(
+                self.GET_FILL_COLUMNS, self._fill_range(after, until)
+            )
+            rows: list[tuple] = cur.fetchall()
+        columns: list[tuple] = list(zip(*rows)) or [()] * len(ORDER_COLUMNS)
+        return build_order_frame(*columns)
+
+    def put_orders(self, orders: list[Order]) -> None:
+        rows: list[tuple[str, str, float, str]] = [
+            (
+                o.id,
+                o.client_order_id,
+                pd.Timestamp(o.filled_at).timestamp(),
+                json.dumps(o._raw),
+            )
+            for o in orders
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany(self.PUT_FILL, rows)
+
+    @staticmethod
+    def _fill_range(
+        after: pd.Timestamp | None, until: pd.Timestamp | None
+    ) -> tuple[float, float]:
+        return (
+            float("-inf") if after is None else after.timestamp(),
+            float("inf") if until is None else until.timestamp(),
+        )
@@ -0,0 +1,63 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from alpaca_trade_api.common import URL
+from alpaca_trade_api.entity import Entity, Order
+from alpaca_trade_api.stream import Stream
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+MAX_TRACKED_ORDERS: int = 1000
+
+
+class TradeUpdateListener:
+    """
+    Subscribes to the trade_updates stream on a background thread and keeps the
+    latest streamed state of each order, so submitters can block on a fill
+    instead of polling for it.
+    """
+
+    def __init__(self, base_url: str, api_key: str, api_secret: str) -> None:
+        self.stream: Stream = Stream(
+            key_id=api_key, secret_key=api_secret, base_url=URL(base_url)
+        )
+        self.stream.subscribe_trade_updates(self._on_trade_update)
+        self.orders: OrderedDict[str, Order] = OrderedDict()
+        self.updated: threading.Condition = threading.Condition()
+        self.thread: threading.Thread = threading.Thread(
+            target=self.stream.run, name="trade-updates", daemon=True
+        )
+
+    def start(self) -> None:
+        logger.info("Starting trade update stream")
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stream.stop()
+
+    def is_running(self) -> bool:
+        return self.thread.is_alive()
+
+    def wait_for_status(
+        self, order_id: str, statuses: frozenset[str], timeout: float
+    ) -> Order | None:
+        """Blocks until the stream reports order_id in one of statuses, or timeout."""
+
+        def reached() -> Order | None:
+            order: Order | None = self.orders.get(order_id)
+            if order is not None and order.status in statuses:
+                return order
+
+        with self.updated:
+            return self.updated.wait_for(reached, timeout=timeout)
+
+    async def _on_trade_update(self, update: Entity) -> None:
+        order: Order = Order(update.order)
+        with self.updated:
+            self.orders[order.id] = order
+            self.orders.move_to_end(order.id)
+            while len(self.orders) > MAX_TRACKED_ORDERS:
+                self.orders.popitem(last=False)
+            self.updated.notify_all()
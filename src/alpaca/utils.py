@@ -1,6 +1,11 @@
 import datetime
+import threading
+import time
+from collections import deque
 
+import numpy as np
 import pandas as pd
+from alpaca_trade_api.entity_v2 import QuoteV2
 
 
 MKT_OPEN: datetime.time = datetime.time(13, 30)
@@ -9,3 +14,74 @@ MKT_CLOSE: datetime.time = datetime.time(20, 0)
 
 def is_mkt_open(ts: pd.Timestamp) -> bool:
     return ts.weekday() < 5 and MKT_OPEN <= ts.time() <= MKT_CLOSE
+
+
+def to_rfc3339(ts: pd.Timestamp) -> str:
+    return (
+        ts.astimezone(datetime.timezone.utc)
+        .replace(microsecond=0, nanosecond=0)
+        .isoformat()
+        .replace("+00:00", "Z")
+    )
+
+
+def mkt_open_mask(index: pd.DatetimeIndex) -> np.ndarray:
+    """Vectorized `is_mkt_open` over a minute-resolution UTC index."""
+    minute_of_day: np.ndarray = np.asarray(index.hour * 60 + index.minute)
+    is_weekday: np.ndarray = np.asarray(index.weekday < 5)
+    return (
+        is_weekday
+        & (minute_of_day >= MKT_OPEN.hour * 60 + MKT_OPEN.minute)
+        & (minute_of_day <= MKT_CLOSE.hour * 60 + MKT_CLOSE.minute)
+    )
+
+
+class RateLimiter:
+    """Sliding-window request budget, shared by every thread using a client."""
+
+    def __init__(self, max_requests: int, period: float) -> None:
+        self.max_requests: int = max_requests
+        self.period: float = period
+        self.lock: threading.Lock = threading.Lock()
+        self.sent: deque[float] = deque()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now: float = time.monotonic()
+                while self.sent and now - self.sent[0] >= self.period:
+                    self.sent.popleft()
+                if len(self.sent) < self.max_requests:
+                    self.sent.append(now)
+                    return
+                wait: float = self.period - (now - self.sent[0])
+            time.sleep(wait)
+
+
+class QuoteCache:
+    """Latest quote per symbol, considered fresh for `ttl` seconds."""
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl: float = ttl
+        self.lock: threading.Lock = threading.Lock()
+        self.quotes: dict[str, tuple[float, QuoteV2]] = {}
+
+    def get(self, symbols: list[str]) -> tuple[dict[str, QuoteV2], list[str]]:
+        """Splits symbols into fresh cached quotes and symbols that need fetching."""
+        cached: dict[str, QuoteV2] = {}
+        missing: list[str] = []
+        now: float = time.monotonic()
+        with self.lock:
+            for sym in symbols:
+                entry: tuple[float, QuoteV2] | None = self.quotes.get(sym)
+                if entry is not None and now - entry[0] < self.ttl:
+                    cached[sym] = entry[1]
+                else:
+                    missing.append(sym)
+        return cached, missing
+
+    def put(self, quotes: dict[str, QuoteV2]) -> None:
+        now: float = time.monotonic()
+        with self.lock:
+            for sym, quote in quotes.items():
+                self.quotes[sym] = (now, quote)
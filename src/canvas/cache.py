@@ -0,0 +1,79 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+from pydantic import BaseModel
+
+
+IMAGE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+
+def make_key(*parts: str | bytes | pd.DataFrame | list[BaseModel]) -> str:
+    """Content hash of everything that goes into a render."""
+    digest = hashlib.sha256()
+    for part in parts:
+        match part:
+            case pd.DataFrame():
+                digest.update(",".join(map(str, part.columns)).encode())
+                digest.update(pd.util.hash_pandas_object(part).values.tobytes())
+            case list():
+                for model in part:
+                    digest.update(model.model_dump_json().encode())
+            case bytes():
+                digest.update(part)
+            case _:
+                digest.update(str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ImageCache:
+    """
+    Rendered images on disk, named by content hash. Access time is tracked through
+    the file mtime, and the least recently used images are evicted once the
+    directory grows past max_bytes.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = IMAGE_CACHE_MAX_BYTES) -> None:
+        self.root: Path = root
+        self.max_bytes: int = max_bytes
+        self.lock: threading.Lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str, ext: str) -> str | None:
+        path: Path = self.root / f"{key}.{ext}"
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return str(path)
+
+    def put(self, key: str, ext: str, data: bytes) -> str:
+        path: Path = self.root / f"{key}.{ext}"
+        # write then rename, so readers never see a partial image
+        tmp_path: Path = path.with_suffix(f".{ext}.tmp{threading.get_ident()}")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        self._evict(keep=path)
+        return str(path)
+
+    def _evict(self, keep: Path) -> None:
+        with self.lock:
+            entries: list[tuple[float, int, Path]] = []
+            for path in self.root.iterdir():
+                try:
+                    stat: os.stat_result = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total: int = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                path.unlink(missing_ok=True)
+                total -= size
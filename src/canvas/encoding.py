@@ -0,0 +1,59 @@
+import io
+from enum import Enum, auto
+
+from PIL import Image
+
+
+PALETTE_COLORS: int = 256
+IMAGE_QUALITY: int = 85
+
+
+class ImageEncoding(Enum):
+    PNG = auto()
+    PALETTE_PNG = auto()
+    WEBP = auto()
+    JPEG = auto()
+
+    @classmethod
+    def from_str(cls, s: str) -> "ImageEncoding":
+        try:
+            return ImageEncoding[s.upper()]
+        except KeyError:
+            raise ValueError(f"Cannot convert {s} into a valid ImageEncoding")
+
+    @property
+    def ext(self) -> str:
+        return {
+            ImageEncoding.PNG: "png",
+            ImageEncoding.PALETTE_PNG: "png",
+            ImageEncoding.WEBP: "webp",
+            ImageEncoding.JPEG: "jpg",
+        }[self]
+
+
+def encode_image(
+    img: Image.Image, encoding: ImageEncoding, quality: int = IMAGE_QUALITY
+) -> bytes:
+    buf: io.BytesIO = io.BytesIO()
+    match encoding:
+        case ImageEncoding.PNG:
+            img.save(buf, format="PNG")
+        case ImageEncoding.PALETTE_PNG:
+            # charts and tables are mostly flat colour, so 256 colours lose little
+            img.convert("RGB").quantize(
+                colors=PALETTE_COLORS, method=Image.Quantize.FASTOCTREE
+            ).save(buf, format="PNG", optimize=True)
+        case ImageEncoding.WEBP:
+            img.save(buf, format="WEBP", quality=quality)
+        case ImageEncoding.JPEG:
+            img.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def transcode_png(
+    png: bytes, encoding: ImageEncoding, quality: int = IMAGE_QUALITY
+) -> bytes:
+    if encoding == ImageEncoding.PNG:
+        return png
+    with Image.open(io.BytesIO(png)) as img:
+        return encode_image(img, encoding, quality)
@@ -0,0 +1,105 @@
+from dataclasses import dataclass
+from functools import cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+
+FONT_SIZE: int = 14
+ROW_HEIGHT: int = 26
+CELL_PADDING: int = 10
+TITLE_HEIGHT: int = 50
+MARGIN: int = 20
+GRID_COLOR: str = "#d0d0d0"
+
+
+@dataclass(kw_only=True, frozen=True)
+class TableStyle:
+    header_fill: str
+    header_font_color: str
+    cell_fill: str
+    cell_font_color: str
+    summary_fill: str = "#f2f2f2"
+
+
+@cache
+def _load_font(size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
+    return ImageFont.load_default(size=size)
+
+
+def _longest(values: np.ndarray) -> str:
+    if not len(values):
+        return ""
+    return str(values[np.char.str_len(values.astype(str)).argmax()])
+
+
+def draw_table(
+    title: str,
+    columns: dict[str, np.ndarray],
+    style: TableStyle,
+    summary_rows: list[list[str]] | None = None,
+) -> Image.Image:
+    """
+    Draws a static grid of pre-formatted string columns straight onto an image.
+    Only the longest value of each column is measured, so cost grows with the
+    number of rows drawn rather than with text layout.
+    """
+    font = _load_font(FONT_SIZE)
+    summary_rows = summary_rows or []
+    headers: list[str] = list(columns)
+    cells: list[np.ndarray] = [np.asarray(v, dtype=str) for v in columns.values()]
+    num_rows: int = len(cells[0]) if cells else 0
+
+    widths: list[int] = []
+    for i, (header, values) in enumerate(zip(headers, cells)):
+        texts: list[str] = [header, _longest(values)] + [r[i] for r in summary_rows]
+        widths.append(int(max(font.getlength(t) for t in texts)) + 2 * CELL_PADDING)
+    title_width: int = int(font.getlength(title)) + 2 * MARGIN
+    table_width: int = sum(widths)
+    width: int = max(table_width + 2 * MARGIN, title_width)
+    height: int = (
+        TITLE_HEIGHT + (1 + num_rows + len(summary_rows)) * ROW_HEIGHT + MARGIN
+    )
+
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    # anchors aren't supported by the bitmap fallback font, so text is placed
+    # by its top-left corner
+    draw.text(
+        ((width - font.getlength(title)) / 2, (TITLE_HEIGHT - FONT_SIZE) / 2),
+        title,
+        fill="black",
+        font=font,
+    )
+
+    x_edges: np.ndarray = MARGIN + np.concatenate(([0], np.cumsum(widths)))
+    text_offset: float = (ROW_HEIGHT - FONT_SIZE) / 2
+
+    def draw_row(y: int, values: list[str], fill: str, font_color: str) -> None:
+        draw.rectangle(
+            (MARGIN, y, MARGIN + table_width, y + ROW_HEIGHT), fill=fill, outline=None
+        )
+        for x, value in zip(x_edges, values):
+            draw.text(
+                (x + CELL_PADDING, y + text_offset),
+                value,
+                fill=font_color,
+                font=font,
+            )
+
+    y: int = TITLE_HEIGHT
+    draw_row(y, headers, style.header_fill, style.header_font_color)
+    for row in zip(*cells):
+        y += ROW_HEIGHT
+        draw_row(y, row, style.cell_fill, style.cell_font_color)
+    for row in summary_rows:
+        y += ROW_HEIGHT
+        draw_row(y, row, style.summary_fill, style.cell_font_color)
+
+    bottom: int = y + ROW_HEIGHT
+    for x in x_edges:
+        draw.line((x, TITLE_HEIGHT, x, bottom), fill=GRID_COLOR)
+    for row_y in range(TITLE_HEIGHT, bottom + 1, ROW_HEIGHT):
+        draw.line((MARGIN, row_y, MARGIN + table_width, row_y), fill=GRID_COLOR)
+
+    return img
@@ -0,0 +1,46 @@
+import numpy as np
+
+
+def lttb_indices(y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices of the points Largest-Triangle-Three-Buckets keeps when reducing the
+    evenly spaced series y to threshold points. The first and last points are
+    always kept, and every bucket in between keeps the point forming the largest
+    triangle with its neighbouring buckets, which preserves peaks and drawdowns.
+
+    Neighbouring buckets are represented by their averages on both sides (rather
+    than the previously selected point on the left), so all buckets are resolved
+    at once instead of sequentially.
+    """
+    n: int = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=float)
+    # bucket i covers [edges[i], edges[i + 1]) of the interior points 1..n-2
+    edges: np.ndarray = np.linspace(1, n - 1, threshold - 1).astype(int)
+    starts, ends = edges[:-1], edges[1:]
+    counts: np.ndarray = ends - starts
+
+    cum_y: np.ndarray = np.concatenate(([0.0], np.cumsum(y)))
+    mean_x: np.ndarray = (starts + ends - 1) / 2
+    mean_y: np.ndarray = (cum_y[ends] - cum_y[starts]) / counts
+    prev_x: np.ndarray = np.concatenate(([0.0], mean_x[:-1]))
+    prev_y: np.ndarray = np.concatenate(([y[0]], mean_y[:-1]))
+    next_x: np.ndarray = np.concatenate((mean_x[1:], [n - 1.0]))
+    next_y: np.ndarray = np.concatenate((mean_y[1:], [y[-1]]))
+
+    bucket: np.ndarray = np.repeat(np.arange(len(counts)), counts)
+    px: np.ndarray = np.arange(1, n - 1, dtype=float)
+    py: np.ndarray = y[1:-1]
+    ax, ay = prev_x[bucket], prev_y[bucket]
+    area: np.ndarray = np.abs(
+        (ax - next_x[bucket]) * (py - ay) - (ax - px) * (next_y[bucket] - ay)
+    )
+    area = np.nan_to_num(area, nan=-1.0)
+
+    # first point in each bucket that reaches the bucket's max area
+    is_max: np.ndarray = area == np.maximum.reduceat(area, starts - 1)[bucket]
+    candidates: np.ndarray = np.flatnonzero(is_max)
+    _, first = np.unique(bucket[candidates], return_index=True)
+    return np.concatenate(([0], candidates[first] + 1, [n - 1]))
@@ -1,142 +1,121 @@
-import datetime
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+import plotly.io as pio
 
-from stubs import MetricWindow, OrderMetadata, PositionMetadata
+from canvas.cache import IMAGE_CACHE_MAX_BYTES, ImageCache, make_key
+from canvas.encoding import (
+    IMAGE_QUALITY,
+    ImageEncoding,
+    encode_image,
+    transcode_png,
+)
+from canvas.table import TableStyle, draw_table
+from canvas.utils import lttb_indices
+from stubs import MetricWindow, PositionMetadata
 
 
-class DataVisualizer:
+logger: logging.Logger = logging.getLogger(__name__)
 
-    def __init__(self, name: str) -> None:
-        self.path: str = f"/tmp/{name}-{{file_name}}.png"
-
-    def generate_orders_table(self, orders: list[OrderMetadata]) -> str:
-        input_orders: list[dict[str, str | float]] = [
-            {
-                "Timestamp": o.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                "Asset": o.asset,
-                "Order Type": o.type.to_str(),
-                "Order Side": o.side.to_str(),
-                "Qty": o.qty,
-                "Price": f"${o.price:,.2f}",
-            }
-            for o in orders
-        ]
-        df = pd.DataFrame(input_orders)
-        df["Timestamp"] = df["Timestamp"].dt.tz_convert("America/New_York")
-
-        fig = go.Figure(
-            data=[
-                go.Table(
-                    header=dict(
-                        values=list(df.columns), fill_color="lightgray", align="left"
-                    ),
-                    cells=dict(values=[df[col] for col in df.columns], align="left"),
-                )
-            ],
-        )
-        fig.update_layout(
-            title=dict(
-                text="Orders",
-                x=0.5,
-                xanchor="center",
-                font=dict(size=20),
-            ),
-            margin=dict(l=20, r=20, t=60, b=20),
-        )
+MAX_TABLE_ROWS: int = 50
+ORDERS_STYLE: TableStyle = TableStyle(
+    header_fill="lightgray",
+    header_font_color="black",
+    cell_fill="white",
+    cell_font_color="black",
+)
+PORTFOLIO_STYLE: TableStyle = TableStyle(
+    header_fill="black",
+    header_font_color="white",
+    cell_fill="lightblue",
+    cell_font_color="black",
+)
+RENDER_WORKERS: int = 0
+PNL_PLOT_WIDTH: int = 1200
+PNL_PLOT_HEIGHT: int = 600
+# tick times within the trading day, per window
+TICK_OFFSETS: dict[MetricWindow, pd.TimedeltaIndex] = {
+    MetricWindow.DAILY: pd.timedelta_range("9h30min", "16h", freq="15min"),
+    MetricWindow.WEEKLY: pd.timedelta_range("9h30min", "16h", freq="65min"),
+    MetricWindow.MONTHLY: pd.to_timedelta(["9h30min", "12h45min"]),
+    MetricWindow.TOTAL: pd.to_timedelta(["9h30min"]),
+}
 
-        path: str = self.path.format(file_name="orders")
-        fig.write_image(path)
-        return path
-
-    def generate_portfolio_table(self, positions: list[PositionMetadata]) -> str:
-        input_positions: list[dict[str, str | float]] = [
-            {
-                "Asset": p.asset,
-                "Qty": p.qty,
-                "Side": p.side.to_str(),
-                "Avg Entry Price": f"${p.avg_entry_price:,.2f}",
-                "Current Price": f"${p.current_price:,.2f}",
-                "Cost Basis": f"${p.cost_basis:,.2f}",
-                "Market Value": f"${p.market_value:,.2f}",
-                "Unrealized PnL": f"${p.unrealized_pnl:,.2f}",
-            }
-            for p in positions
-        ]
-        df = pd.DataFrame(input_positions)
-
-        fig = go.Figure(
-            data=[
-                go.Table(
-                    header=dict(
-                        values=list(df.columns),
-                        fill_color="black",
-                        align="center",
-                        font_color="white",
-                    ),
-                    cells=dict(
-                        values=[df[col] for col in df.columns],
-                        fill_color="lightblue",
-                        align="left",
-                        font_color="black",
-                    ),
-                )
-            ]
-        )
-        fig.update_layout(
-            title=dict(
-                text="Portfolio Positions",
-                x=0.5,
-                xanchor="center",
-                font=dict(size=20),
-            ),
-            autosize=False,
-            width=800,  # Make table wider
-            height=400,  # Optional: increase if you have many rows
-            margin=dict(l=20, r=20, t=60, b=20),
-        )
 
-        path: str = self.path.format(file_name="portfolio")
-        fig.write_image(path)
-        return path
+def _warm_renderer() -> None:
+    """
+    kaleido keeps its chromium process alive once started, so starting it up
+    front spares the first chart request the browser launch.
+    """
+    try:
+        # charts don't use LaTeX, so skip fetching MathJax on startup
+        pio.kaleido.scope.mathjax = None
+        pio.to_image(go.Figure(), format="png", width=10, height=10)
+    except Exception as e:
+        logger.error(f"Failed to warm up renderer: {str(e)}")
 
-    def generate_pnl_plot(self, df: pd.DataFrame, window: MetricWindow) -> str:
-        df["timestamp"] = df["timestamp"].dt.tz_convert("America/New_York")
 
-        fig: go.Figure = go.Figure()
+def _figure_to_bytes(
+    fig: go.Figure, encoding: ImageEncoding, quality: int, **kwargs
+) -> bytes:
+    return transcode_png(fig.to_image(format="png", **kwargs), encoding, quality)
 
-        fig.add_trace(
-            go.Scatter(
-                x=df["timestamp"],
-                y=df["total_pnl"],
-                mode="lines",
-                name="Total PnL",
-                line=dict(width=2),
-            )
+
+@dataclass(kw_only=True)
+class TableJob:
+    title: str
+    columns: dict[str, np.ndarray]
+    style: TableStyle
+    summary_rows: list[list[str]]
+
+    def render(self, encoding: ImageEncoding, quality: int) -> bytes:
+        return encode_image(
+            draw_table(self.title, self.columns, self.style, self.summary_rows),
+            encoding,
+            quality,
         )
 
-        fig.add_trace(
-            go.Scatter(
-                x=df["timestamp"],
-                y=df["realized_pnl"],
-                mode="lines",
-                name="Realized PnL",
-                line=dict(dash="dash"),
-            )
+
+@dataclass(kw_only=True)
+class PnlPlotJob:
+    # epoch nanoseconds (UTC) of the points any trace kept, and per trace the
+    # positions of its points among them with their values
+    timestamps: np.ndarray
+    traces: dict[str, tuple[np.ndarray, np.ndarray]]
+    window: MetricWindow
+
+    def render(self, encoding: ImageEncoding, quality: int) -> bytes:
+        ts: pd.Series = pd.Series(
+            pd.to_datetime(self.timestamps, utc=True).tz_convert("America/New_York")
         )
 
-        fig.add_trace(
-            go.Scatter(
-                x=df["timestamp"],
-                y=df["unrealized_pnl"],
-                mode="lines",
-                name="Unrealized PnL",
-                line=dict(dash="dot"),
+        fig: go.Figure = go.Figure()
+
+        for name, line in (
+            ("Total PnL", dict(width=2)),
+            ("Realized PnL", dict(dash="dash")),
+            ("Unrealized PnL", dict(dash="dot")),
+        ):
+            keep, values = self.traces[name]
+            fig.add_trace(
+                go.Scatter(
+                    x=ts.iloc[keep],
+                    y=values,
+                    mode="lines",
+                    name=name,
+                    line=line,
+                )
             )
-        )
 
-        tickformat, tickvals = self._resolve_tick_format_and_vals(df, window)
+        tickformat, tickvals = self._resolve_tick_format_and_vals(ts, self.window)
 
         fig.update_layout(
             title="PnL Over Time",
@@ -159,35 +138,202 @@ class DataVisualizer:
             ),
         )
 
-        path: str = self.path.format(file_name="pnl")
-        fig.write_image(path, width=1200, height=600)
-        return path
+        return _figure_to_bytes(
+            fig, encoding, quality, width=PNL_PLOT_WIDTH, height=PNL_PLOT_HEIGHT
+        )
 
     @staticmethod
     def _resolve_tick_format_and_vals(
-        df: pd.DataFrame, window: MetricWindow
+        ts: pd.Series, window: MetricWindow
     ) -> tuple[str, list[pd.Timestamp]]:
-        tickformat: str = "%m-%d %H:%M"
-        dates: list[datetime.date] = df["timestamp"].dt.date.unique()
-
-        if window == MetricWindow.DAILY:
-            times = pd.date_range("09:30", "16:00", freq="15min").time
-            tickformat = "%H:%M"
-        elif window == MetricWindow.WEEKLY:
-            times = pd.date_range("09:30", "16:00", freq="65min").time
-        elif window == MetricWindow.MONTHLY:
-            times = [datetime.time(9, 30), datetime.time(12, 45)]
-        elif window == MetricWindow.TOTAL:
-            times = [datetime.time(9, 30)]
-            tickformat = "%m-%d"
-        else:
+        if window not in TICK_OFFSETS:
             raise ValueError(f"Cannot resolve plot tickvals for window {window.name}")
+        tickformat: str = {
+            MetricWindow.DAILY: "%H:%M",
+            MetricWindow.TOTAL: "%m-%d",
+        }.get(window, "%m-%d %H:%M")
+
+        days: np.ndarray = (
+            ts.dt.tz_localize(None).dt.normalize().drop_duplicates().to_numpy()
+        )
+        candidates: pd.DatetimeIndex = pd.DatetimeIndex(
+            (days[:, None] + TICK_OFFSETS[window].to_numpy()[None, :]).ravel()
+        ).tz_localize("America/New_York")
+        in_range: np.ndarray = (candidates >= ts.min()) & (candidates <= ts.max())
+        return tickformat, list(candidates[in_range])
+
 
-        tickvals: list[pd.Timestamp] = []
-        for d in dates:
-            for t in times:
-                dt = pd.Timestamp.combine(d, t).tz_localize("America/New_York")
-                if df["timestamp"].min() <= dt <= df["timestamp"].max():
-                    tickvals.append(dt)
+def _render_job(
+    job: TableJob | PnlPlotJob, encoding: ImageEncoding, quality: int
+) -> bytes:
+    return job.render(encoding, quality)
 
-        return tickformat, tickvals
+
+class DataVisualizer:
+
+    def __init__(
+        self,
+        name: str,
+        cache_max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+        warm_renderer: bool = True,
+        encoding: ImageEncoding = ImageEncoding.PALETTE_PNG,
+        quality: int = IMAGE_QUALITY,
+        render_workers: int = RENDER_WORKERS,
+        render_root: Path | None = None,
+    ) -> None:
+        self.encoding: ImageEncoding = encoding
+        self.quality: int = quality
+        self.cache: ImageCache = ImageCache(
+            root=render_root or Path(f"/tmp/{name}-renders"),
+            max_bytes=cache_max_bytes,
+        )
+        # figure building and encoding hold the GIL, so with workers they run in
+        # separate processes and the broker's threads keep going meanwhile
+        self.pool: ProcessPoolExecutor | None = None
+        if render_workers > 0:
+            self.pool = ProcessPoolExecutor(
+                max_workers=render_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_renderer if warm_renderer else None,
+            )
+        elif warm_renderer:
+            threading.Thread(
+                target=_warm_renderer, name="renderer-warmup", daemon=True
+            ).start()
+
+    def _cache_key(self, *parts) -> str:
+        return make_key(*parts, self.encoding.name, self.quality)
+
+    def _submit(self, parts: tuple, make_job: Callable) -> Future[str]:
+        """
+        Future of the path to the rendered image. Cached renders resolve right away,
+        and the job is only built on a cache miss.
+        """
+        key: str = self._cache_key(*parts)
+        result: Future[str] = Future()
+        if (path := self.cache.get(key, self.encoding.ext)) is not None:
+            result.set_result(path)
+            return result
+
+        job: TableJob | PnlPlotJob = make_job()
+        if self.pool is None:
+            data: bytes = job.render(self.encoding, self.quality)
+            result.set_result(self.cache.put(key, self.encoding.ext, data))
+            return result
+
+        def on_rendered(rendered: Future[bytes]) -> None:
+            try:
+                data: bytes = rendered.result()
+                result.set_result(self.cache.put(key, self.encoding.ext, data))
+            except Exception as e:
+                result.set_exception(e)
+
+        self.pool.submit(
+            _render_job, job, self.encoding, self.quality
+        ).add_done_callback(on_rendered)
+        return result
+
+    def submit_orders_table(self, orders: pd.DataFrame) -> Future[str]:
+        return self._submit(("orders", orders), lambda: self._orders_job(orders))
+
+    def submit_portfolio_table(self, positions: list[PositionMetadata]) -> Future[str]:
+        return self._submit(
+            ("portfolio", positions), lambda: self._portfolio_job(positions)
+        )
+
+    def submit_pnl_plot(self, df: pd.DataFrame, window: MetricWindow) -> Future[str]:
+        return self._submit(("pnl", window, df), lambda: self._pnl_job(df, window))
+
+    def shutdown(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _orders_job(orders: pd.DataFrame) -> TableJob:
+        # only the most recent orders are drawn, so only they get formatted
+        shown: pd.DataFrame = orders.tail(MAX_TABLE_ROWS)
+        timestamps: pd.DatetimeIndex = pd.DatetimeIndex(shown["timestamp"]).tz_convert(
+            "America/New_York"
+        )
+        columns: dict[str, np.ndarray] = {
+            "Timestamp": timestamps.strftime("%Y-%m-%d %H:%M:%S").to_numpy(),
+            "Asset": shown["asset"].to_numpy(dtype=str),
+            "Order Type": shown["type"].to_numpy(dtype=str),
+            "Order Side": shown["side"].to_numpy(dtype=str),
+            "Qty": np.array([f"{q:g}" for q in shown["qty"]]),
+            "Price": np.array([f"${p:,.2f}" for p in shown["price"]]),
+        }
+        summary_rows: list[list[str]] = []
+        if len(orders) > len(shown):
+            summary_rows.append(
+                [f"+{len(orders) - len(shown):,} earlier orders"]
+                + [""] * (len(columns) - 1)
+            )
+        return TableJob(
+            title="Orders",
+            columns=columns,
+            style=ORDERS_STYLE,
+            summary_rows=summary_rows,
+        )
+
+    @staticmethod
+    def _portfolio_job(positions: list[PositionMetadata]) -> TableJob:
+        # largest positions first, with totals over every position
+        shown: list[PositionMetadata] = sorted(
+            positions, key=lambda p: abs(p.market_value), reverse=True
+        )[:MAX_TABLE_ROWS]
+        columns: dict[str, np.ndarray] = {
+            "Asset": np.array([p.asset for p in shown]),
+            "Qty": np.array([f"{p.qty:g}" for p in shown]),
+            "Side": np.array([p.side.to_str() for p in shown]),
+            "Avg Entry Price": np.array([f"${p.avg_entry_price:,.2f}" for p in shown]),
+            "Current Price": np.array([f"${p.current_price:,.2f}" for p in shown]),
+            "Cost Basis": np.array([f"${p.cost_basis:,.2f}" for p in shown]),
+            "Market Value": np.array([f"${p.market_value:,.2f}" for p in shown]),
+            "Unrealized PnL": np.array([f"${p.unrealized_pnl:,.2f}" for p in shown]),
+        }
+        hidden: int = len(positions) - len(shown)
+        summary_rows: list[list[str]] = [
+            [
+                "Total" if not hidden else f"Total (+{hidden:,} more)",
+                "",
+                "",
+                "",
+                "",
+                f"${sum(p.cost_basis for p in positions):,.2f}",
+                f"${sum(p.market_value for p in positions):,.2f}",
+                f"${sum(p.unrealized_pnl for p in positions):,.2f}",
+            ]
+        ]
+        return TableJob(
+            title="Portfolio Positions",
+            columns=columns,
+            style=PORTFOLIO_STYLE,
+            summary_rows=summary_rows,
+        )
+
+    @staticmethod
+    def _pnl_job(df: pd.DataFrame, window: MetricWindow) -> PnlPlotJob:
+        # more points than horizontal pixels only slows down rendering, so each
+        # trace is downsampled before it's shipped to the renderer, timestamps
+        # included
+        keeps: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for column, name in (
+            ("total_pnl", "Total PnL"),
+            ("realized_pnl", "Realized PnL"),
+            ("unrealized_pnl", "Unrealized PnL"),
+        ):
+            values: np.ndarray = df[column].to_numpy()
+            keep: np.ndarray = lttb_indices(values, PNL_PLOT_WIDTH)
+            keeps[name] = (keep, values[keep])
+
+        kept: np.ndarray = np.unique(np.concatenate([k for k, _ in keeps.values()]))
+        timestamps: np.ndarray = pd.DatetimeIndex(df["timestamp"]).as_unit("ns").asi8
+        return PnlPlotJob(
+            timestamps=timestamps[kept],
+            traces={
+                name: (np.searchsorted(kept, keep), values)
+                for name, (keep, values) in keeps.items()
+            },
+            window=window,
+        )
@@ -1,5 +1,5 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from dotenv import load_dotenv
 
@@ -7,6 +7,10 @@ from config.environment import Environment
 from errors import MissingConfigError
 
 
+# prompt types that can be routed to their own model via OPENAI_MODEL_<TYPE>
+ROUTED_PROMPT_TYPES: tuple[str, ...] = ("RESOLVE", "INIT", "RAND", "ERR")
+
+
 def env_get(key: str, required: bool = True) -> str | None:
     if not required:
         return os.environ.get(key)
@@ -29,9 +33,29 @@ class AppConfig:
     openai_api_key: str
     openai_model: str = "gpt-4-0125-preview"
     openai_temperature: float = 1.0
+    openai_prompt_models: dict[str, str] = field(default_factory=dict)
+    few_shot_examples: int = 4
+    llm_transport: str = "live"
+    llm_cassette: str = "llm.jsonl"
+    llm_replay_latency: str = "recorded"
+    llm_replay_seed: int | None = None
+    phrase_pool_depth: int = 3
+    phrase_dedup_window: int = 20
+    fast_intents: bool = True
+    stream_completions: bool = False
+    structured_output: bool = False
+    max_repair_retries: int = 1
     log_level: str = "INFO"
     messenger_lag: int = 7
     max_broker_lag: int = 3600
+    bar_cache_max_bars: int = 2_000_000
+    quote_ttl: float = 2.0
+    image_cache_max_bytes: int = 64 * 1024 * 1024
+    image_encoding: str = "palette_png"
+    image_quality: int = 85
+    render_workers: int = 0
+    trade_stream: bool = False
+    async_broker: bool = False
 
     @classmethod
     def from_environment(cls) -> "AppConfig":
@@ -52,6 +76,45 @@ class AppConfig:
             openai_temperature=float(
                 env_get("OPENAI_TEMPERATURE", required=False) or cls.openai_temperature
             ),
+            openai_prompt_models={
+                prompt_type: model
+                for prompt_type in ROUTED_PROMPT_TYPES
+                if (model := env_get(f"OPENAI_MODEL_{prompt_type}", required=False))
+            },
+            few_shot_examples=int(
+                env_get("FEW_SHOT_EXAMPLES", required=False) or cls.few_shot_examples
+            ),
+            llm_transport=env_get("LLM_TRANSPORT", required=False) or cls.llm_transport,
+            llm_cassette=env_get("LLM_CASSETTE", required=False) or cls.llm_cassette,
+            llm_replay_latency=env_get("LLM_REPLAY_LATENCY", required=False)
+            or cls.llm_replay_latency,
+            llm_replay_seed=(
+                int(seed)
+                if (seed := env_get("LLM_REPLAY_SEED", required=False))
+                else cls.llm_replay_seed
+            ),
+            phrase_pool_depth=int(
+                env_get("PHRASE_POOL_DEPTH", required=False) or cls.phrase_pool_depth
+            ),
+            phrase_dedup_window=int(
+                env_get("PHRASE_DEDUP_WINDOW", required=False)
+                or cls.phrase_dedup_window
+            ),
+            fast_intents=(
+                env_get("FAST_INTENTS", required=False) or str(cls.fast_intents)
+            ).lower()
+            == "true",
+            stream_completions=(
+                env_get("STREAM_COMPLETIONS", required=False) or ""
+            ).lower()
+            == "true",
+            structured_output=(
+                env_get("STRUCTURED_OUTPUT", required=False) or ""
+            ).lower()
+            == "true",
+            max_repair_retries=int(
+                env_get("MAX_REPAIR_RETRIES", required=False) or cls.max_repair_retries
+            ),
             log_level=env_get("LOG_LEVEL", required=False) or cls.log_level,
             messenger_lag=(
                 int(env_get("MESSENGER_LAG", required=False) or cls.messenger_lag)
@@ -59,4 +122,26 @@ class AppConfig:
             max_broker_lag=(
                 int(env_get("MAX_BROKER_LAG", required=False) or cls.max_broker_lag)
             ),
+            bar_cache_max_bars=int(
+                env_get("BAR_CACHE_MAX_BARS", required=False) or cls.bar_cache_max_bars
+            ),
+            quote_ttl=float(env_get("QUOTE_TTL", required=False) or cls.quote_ttl),
+            image_cache_max_bytes=int(
+                env_get("IMAGE_CACHE_MAX_BYTES", required=False)
+                or cls.image_cache_max_bytes
+            ),
+            image_encoding=env_get("IMAGE_ENCODING", required=False)
+            or cls.image_encoding,
+            image_quality=int(
+                env_get("IMAGE_QUALITY", required=False) or cls.image_quality
+            ),
+            render_workers=int(
+                env_get("RENDER_WORKERS", required=False) or cls.render_workers
+            ),
+            trade_stream=(
+                (env_get("TRADE_STREAM", required=False) or "").lower() == "true"
+            ),
+            async_broker=(
+                (env_get("ASYNC_BROKER", required=False) or "").lower() == "true"
+            ),
         )
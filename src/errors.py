@@ -29,3 +29,10 @@ class UnexpectedGptResponse(Exception):
 
     def __init__(self, resp: str) -> None:
         super().__init__(self.ERR_MSG.format(resp=resp))
+
+
+class CassetteMiss(Exception):
+    ERR_MSG: str = "No recorded completion for request {key} in cassette {cassette}"
+
+    def __init__(self, key: str, cassette: str) -> None:
+        super().__init__(self.ERR_MSG.format(key=key, cassette=cassette))
@@ -1,5 +1,4 @@
 import random
-import time
 from typing import Any, Callable
 
 from selenium.webdriver import Firefox
@@ -15,18 +14,42 @@ class Controller:
     MAX_X_OFFSET: int = 5
     MAX_Y_OFFSET: int = 15
 
-    def __init__(self, driver: Firefox) -> None:
+    # upper bound on time spent typing a single message, in seconds
+    TYPING_BUDGET: float = 3.0
+    # messages longer than this are sent in one burst instead of key by key
+    BULK_TYPING_THRESHOLD: int = 280
+
+    def __init__(
+        self,
+        driver: Firefox,
+        typing_budget: float = TYPING_BUDGET,
+        bulk_typing_threshold: int = BULK_TYPING_THRESHOLD,
+    ) -> None:
         self.actions: ActionChains = ActionChains(driver)
+        self.typing_budget: float = typing_budget
+        self.bulk_typing_threshold: int = bulk_typing_threshold
 
     @staticmethod
     def humanize(f: Callable) -> Callable:
+        """Queues a random pause ahead of the action, replayed on perform()."""
+
         def inner(self: "Controller", *args, **kwargs) -> Any:
-            pause_time: float = random.uniform(self.MIN_WAIT_TIME, self.MAX_WAIT_TIME)
-            time.sleep(pause_time)
+            self.actions.pause(self._random_pause())
             return f(self, *args, **kwargs)
 
         return inner
 
+    def _random_pause(self) -> float:
+        return random.uniform(self.MIN_WAIT_TIME, self.MAX_WAIT_TIME)
+
+    def _typing_schedule(self, num_keys: int) -> list[float]:
+        """Humanized pause before each key, scaled down to fit the typing budget."""
+        pauses: list[float] = [self._random_pause() for _ in range(num_keys)]
+        total: float = sum(pauses)
+        if total > self.typing_budget:
+            pauses = [p * self.typing_budget / total for p in pauses]
+        return pauses
+
     @humanize
     def _move_to_element(self, element: WebElement, x: int, y: int) -> None:
         self.actions.move_to_element_with_offset(
@@ -37,8 +60,8 @@ class Controller:
     def _click(self) -> None:
         self.actions.click()
 
-    @humanize
-    def _type_char(self, c: str) -> None:
+    def _type_char(self, c: str, pause: float) -> None:
+        self.actions.pause(pause)
         self.actions.key_down(c)
         self.actions.key_up(c)
 
@@ -51,8 +74,12 @@ class Controller:
         self._click()
 
     def type_text(self, text: str) -> None:
-        for c in text:
-            self._type_char(c)
-        self._type_char(Keys.ENTER)
+        if len(text) > self.bulk_typing_threshold:
+            self.actions.send_keys(text)
+            self._type_char(Keys.ENTER, pause=self._random_pause())
+        else:
+            keys: list[str] = [*text, Keys.ENTER]
+            for c, pause in zip(keys, self._typing_schedule(len(keys))):
+                self._type_char(c, pause=pause)
         self.actions.perform()
         self.actions.reset_actions()
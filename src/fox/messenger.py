@@ -3,10 +3,10 @@ import random
 import time
 from dataclasses import dataclass
 
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver import Firefox
 from selenium.webdriver.common.by import By
 from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.remote.webelement import WebElement
 
 from fox.controller import Controller
 
@@ -18,6 +18,81 @@ MIN_SCAN_TIME: int = 3
 PROFILE_PATH: str = (
     "/Users/{user}/Library/Application Support/Firefox/Profiles/{profile}"
 )
+# headroom on top of the scan delay before selenium gives up on an async script
+SCRIPT_TIMEOUT_SLACK: int = 5
+MAX_QUEUED_ROWS: int = 100
+
+# Queues chat rows as they're added to the page, waking a pending waiter
+OBSERVE_ROWS_JS: str = f"""
+if (!window.__cardoObserver) {{
+    window.__cardoRows = [];
+    window.__cardoWaiter = null;
+    window.__cardoObserver = new MutationObserver((mutations) => {{
+        for (const mutation of mutations) {{
+            for (const node of mutation.addedNodes) {{
+                if (node.nodeType !== Node.ELEMENT_NODE) continue;
+                if (node.matches("div[role='row']") || node.querySelector("div[role='row']")) {{
+                    window.__cardoRows.push(node);
+                }}
+            }}
+        }}
+        window.__cardoRows.splice(0, window.__cardoRows.length - {MAX_QUEUED_ROWS});
+        if (window.__cardoRows.length && window.__cardoWaiter) {{
+            window.__cardoWaiter();
+        }}
+    }});
+    window.__cardoObserver.observe(document.body, {{childList: true, subtree: true}});
+}}
+"""
+# Resolves with the number of queued rows once any exist, 0 on timeout, or null if
+# the observer is gone (e.g. after a page reload)
+WAIT_FOR_ROWS_JS: str = """
+const timeoutMs = arguments[0];
+const done = arguments[arguments.length - 1];
+if (!window.__cardoObserver) {
+    done(null);
+    return;
+}
+const drain = () => {
+    window.__cardoWaiter = null;
+    done(window.__cardoRows.splice(0).length);
+};
+if (window.__cardoRows.length) {
+    drain();
+    return;
+}
+const timer = setTimeout(drain, timeoutMs);
+window.__cardoWaiter = () => {
+    clearTimeout(timer);
+    drain();
+};
+"""
+
+# Tags each text row with an id that sticks to its DOM node (prefixed per page load so
+# ids are never reused), and returns the last N of them oldest first
+LATEST_MESSAGES_JS: str = """
+const limit = arguments[0];
+window.__cardoSession = window.__cardoSession || Math.random().toString(36).slice(2);
+window.__cardoNextId = window.__cardoNextId || 1;
+const rows = document.querySelectorAll("div[role='row']");
+const messages = [];
+for (let i = rows.length - 1; i >= 0 && messages.length < limit; i--) {
+    const textElem = rows[i].querySelector("div[dir='auto']");
+    const text = textElem ? textElem.innerText.trim() : "";
+    if (!text) continue;
+    if (!rows[i].dataset.cardoId) {
+        rows[i].dataset.cardoId = `${window.__cardoSession}-${window.__cardoNextId++}`;
+    }
+    messages.push({id: rows[i].dataset.cardoId, text: text});
+}
+return messages.reverse();
+"""
+
+
+@dataclass(kw_only=True, frozen=True)
+class ChatMessage:
+    id: str
+    text: str
 
 
 @dataclass(kw_only=True)
@@ -27,11 +102,17 @@ class ChatResponse:
 
 
 class Messenger:
-    def __init__(self, user: str, profile: str, lag: int) -> None:
+    def __init__(
+        self, user: str, profile: str, lag: int, observe_rows: bool = True
+    ) -> None:
         self.lag: int = lag
         assert self.lag - LAG_JITTER >= MIN_SCAN_TIME
+        self.observe_rows: bool = observe_rows
         self.driver: Firefox = self._build_driver(user=user, profile=profile)
         self.controller: Controller = Controller(self.driver)
+        if self.observe_rows:
+            self.driver.set_script_timeout(self.lag + LAG_JITTER + SCRIPT_TIMEOUT_SLACK)
+            self._install_row_observer()
 
     def _build_driver(self, user: str, profile: str) -> Firefox:
         options: Options = Options()
@@ -43,27 +124,49 @@ class Messenger:
         )
         return driver
 
-    def wait(self) -> None:
-        scan_wait: float = random.uniform(self.lag - LAG_JITTER, self.lag + LAG_JITTER)
+    def next_scan_delay(self) -> float:
+        return random.uniform(self.lag - LAG_JITTER, self.lag + LAG_JITTER)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Returns as soon as a new chat row shows up, or after timeout (the scan delay
+        by default). Falls back to sleeping when the page observer isn't available.
+        True if a new row cut the wait short.
+        """
+        scan_wait: float = self.next_scan_delay() if timeout is None else timeout
+        if self.observe_rows:
+            new_rows: int | None = self._wait_for_rows(scan_wait)
+            if new_rows is not None:
+                return new_rows > 0
         time.sleep(scan_wait)
-
-    def get_latest_message(self) -> str | None:
-        rows: list[WebElement] = self.driver.find_elements(
-            By.CSS_SELECTOR, "div[role='row']"
+        return False
+
+    def _install_row_observer(self) -> None:
+        try:
+            self.driver.execute_script(OBSERVE_ROWS_JS)
+        except WebDriverException as e:
+            logger.warning(f"Failed to install chat row observer: {e.msg}")
+
+    def _wait_for_rows(self, timeout: float) -> int | None:
+        try:
+            new_rows: int | None = self.driver.execute_async_script(
+                WAIT_FOR_ROWS_JS, int(timeout * 1000)
+            )
+        except WebDriverException as e:
+            logger.warning(f"Chat row observer failed: {e.msg}")
+            new_rows = None
+
+        if new_rows is None:
+            # page was reloaded or the script failed, re-arm for the next scan
+            self._install_row_observer()
+        return new_rows
+
+    def get_latest_messages(self, limit: int) -> list[ChatMessage]:
+        """Last `limit` text messages in the chat, oldest first, in one round trip."""
+        rows: list[dict[str, str]] = self.driver.execute_script(
+            LATEST_MESSAGES_JS, limit
         )
-        if not rows:
-            return None
-
-        for row in reversed(rows):
-            try:
-                text_elem = row.find_element(By.CSS_SELECTOR, "div[dir='auto']")
-                text = text_elem.text.strip()
-                if text:
-                    return text
-            except Exception:
-                continue
-
-        return None
+        return [ChatMessage(id=row["id"], text=row["text"]) for row in rows]
 
     def respond(self, response: ChatResponse) -> None:
         if response.img_path is not None:
@@ -1,13 +1,22 @@
+import asyncio
 import logging
+import queue
+import signal
+import threading
 
 from agent.broker import Broker
 from agent.character import LlmCharacter
+from agent.transport import TransportMode, get_llm_transport
 from alpaca.client import AlpacaClient, get_alpaca_client
 from alpaca.exchange import Exchange
 from alpaca.herder import AlpacaHerder
 from alpaca.ledger import Ledger
+from alpaca.store import BarStore, OrderJournal
+from alpaca.stream import TradeUpdateListener
+from canvas.encoding import ImageEncoding
 from canvas.visualizer import DataVisualizer
 from config.app_config import AppConfig
+from config.environment import Environment
 from fox.messenger import Messenger
 
 
@@ -22,10 +31,34 @@ def create_herder(config: AppConfig, name: str) -> AlpacaHerder:
         api_key=config.alpaca_api_key,
         api_secret=config.alpaca_api_secret,
         test_id=config.alpaca_test_id,
+        quote_ttl=config.quote_ttl,
+    )
+    journal_id: str = (
+        config.alpaca_test_id
+        if config.env == Environment.TEST
+        else config.env.name.lower()
+    )
+    journal: OrderJournal = OrderJournal(name=f"{name}-{journal_id}")
+    listener: TradeUpdateListener | None = None
+    if config.trade_stream and config.env != Environment.TEST:
+        listener = TradeUpdateListener(
+            base_url=config.alpaca_base_url,
+            api_key=config.alpaca_api_key,
+            api_secret=config.alpaca_api_secret,
+        )
+        listener.start()
+    exchange: Exchange = Exchange(
+        client=client, name=name, journal=journal, listener=listener
+    )
+    bar_store: BarStore = BarStore(max_bars=config.bar_cache_max_bars)
+    ledger: Ledger = Ledger(client=client, bar_store=bar_store)
+    visualizer: DataVisualizer = DataVisualizer(
+        name=name,
+        cache_max_bytes=config.image_cache_max_bytes,
+        encoding=ImageEncoding.from_str(config.image_encoding),
+        quality=config.image_quality,
+        render_workers=config.render_workers,
     )
-    exchange: Exchange = Exchange(client=client, name=name)
-    ledger: Ledger = Ledger(client=client)
-    visualizer: DataVisualizer = DataVisualizer(name=name)
     return AlpacaHerder(
         env=config.env,
         exchange=exchange,
@@ -45,6 +78,20 @@ def initialize_broker(config: AppConfig) -> Broker:
         openai_api_key=config.openai_api_key,
         model=config.openai_model,
         temperature=config.openai_temperature,
+        phrase_pool_depth=config.phrase_pool_depth,
+        phrase_dedup_window=config.phrase_dedup_window,
+        fast_intents=config.fast_intents,
+        stream_completions=config.stream_completions,
+        structured_output=config.structured_output,
+        max_repair_retries=config.max_repair_retries,
+        prompt_models=config.openai_prompt_models,
+        few_shot_examples=config.few_shot_examples,
+        transport=get_llm_transport(
+            mode=TransportMode.from_str(config.llm_transport),
+            cassette=config.llm_cassette,
+            latency=config.llm_replay_latency,
+            seed=config.llm_replay_seed,
+        ),
     )
     herder: AlpacaHerder = create_herder(config=config, name=config.broker_name)
     return Broker(
@@ -56,14 +103,38 @@ def initialize_broker(config: AppConfig) -> Broker:
     )
 
 
+def watch_completion_stats(broker: Broker) -> None:
+    """
+    Dumps completion stats on `kill -USR1 <pid>`. The handler only queues the
+    request, since it runs on the main thread and may interrupt it while it holds
+    the stats lock; a daemon thread takes the lock and logs the dump.
+    """
+    # SimpleQueue.put is reentrant, so it's safe to call from a signal handler
+    requests: queue.SimpleQueue[int] = queue.SimpleQueue()
+
+    def dump() -> None:
+        while True:
+            requests.get()
+            logging.info(
+                f"Completion stats:\n{broker.character.dump_completion_stats()}"
+            )
+
+    threading.Thread(target=dump, name="completion-stats", daemon=True).start()
+    signal.signal(signal.SIGUSR1, lambda signum, _: requests.put(signum))
+
+
 def run() -> None:
     config: AppConfig = AppConfig.from_environment()
     setup_env(config)
 
     broker: Broker = initialize_broker(config)
+    watch_completion_stats(broker)
     broker.start()
     try:
-        broker.run()
+        if config.async_broker:
+            asyncio.run(broker.run_async())
+        else:
+            broker.run()
     except KeyboardInterrupt:
         broker.stop()
 
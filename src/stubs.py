@@ -1,7 +1,6 @@
 from enum import Enum, auto
 
-import pandas as pd
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel
 
 
 # Structs #
@@ -68,16 +67,6 @@ class OrderStatus(Enum):
         return self.name.lower()
 
 
-class OrderMetadata(BaseModel):
-    model_config = ConfigDict(arbitrary_types_allowed=True)
-    timestamp: pd.Timestamp
-    asset: str
-    type: OrderType
-    side: OrderSide
-    qty: float
-    price: float
-
-
 class PositionMetadata(BaseModel):
     asset: str
     qty: float
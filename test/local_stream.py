@@ -0,0 +1,88 @@
+import asyncio
+import json
+import threading
+
+import websockets
+
+
+class LocalTradeStream:
+    """
+    Stand-in for alpaca's trade_updates websocket. Speaks just enough of the
+    protocol for TradingStream to connect, so order updates can be published
+    locally without network access.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 0) -> None:
+        self.host: str = host
+        self.port: int = port
+        self.clients: set = set()
+        self.server: websockets.WebSocketServer | None = None
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self.ready: threading.Event = threading.Event()
+        self.thread: threading.Thread = threading.Thread(
+            target=self._serve, name="local-trade-stream", daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> str:
+        self.thread.start()
+        self.ready.wait()
+        return self.base_url
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def publish(self, event: str, order: dict) -> None:
+        message: str = json.dumps(
+            {"stream": "trade_updates", "data": {"event": event, "order": order}}
+        )
+        asyncio.run_coroutine_threadsafe(self._broadcast(message), self.loop).result()
+
+    def _serve(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(
+            websockets.serve(self._handle, self.host, self.port)
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.ready.set()
+        self.loop.run_forever()
+
+    async def _close(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _broadcast(self, message: str) -> None:
+        for ws in list(self.clients):
+            await ws.send(message)
+
+    async def _handle(self, ws, *args) -> None:
+        async for raw in ws:
+            msg: dict = json.loads(raw)
+            match msg.get("action"):
+                case "authenticate":
+                    await ws.send(
+                        json.dumps(
+                            {
+                                "stream": "authorization",
+                                "data": {
+                                    "action": "authenticate",
+                                    "status": "authorized",
+                                },
+                            }
+                        )
+                    )
+                case "listen":
+                    self.clients.add(ws)
+                    await ws.send(
+                        json.dumps(
+                            {
+                                "stream": "listening",
+                                "data": {"streams": msg["data"]["streams"]},
+                            }
+                        )
+                    )
+        self.clients.discard(ws)
@@ -0,0 +1,218 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import alpaca.client
+from agent.broker import Broker
+from alpaca.exchange import Exchange
+from alpaca.herder import AlpacaHerder
+from alpaca.ledger import Ledger
+from alpaca.store import OrderJournal
+from canvas.visualizer import DataVisualizer
+from config.environment import Environment
+from fox.messenger import ChatMessage, ChatResponse
+from stubs import (
+    GetOrdersRequest,
+    MetricWindow,
+    NullRequest,
+    OrderSide,
+    OrderType,
+    Request,
+    SubmitTradeRequest,
+)
+
+
+RESPONSE_TIMEOUT: float = 30.0
+
+
+class FakeMessenger:
+    def __init__(self, failing_sends: int = 0, scan_delay: float = 0.01) -> None:
+        self.messages: list[ChatMessage] = [ChatMessage(id="0", text="hi")]
+        self.responses: list[ChatResponse] = []
+        self.failing_sends: int = failing_sends
+        self.scan_delay: float = scan_delay
+        # stands in for the page's chat row observer
+        self.new_row: threading.Event = threading.Event()
+
+    def post(self, message: ChatMessage) -> None:
+        self.messages.append(message)
+        self.new_row.set()
+
+    def next_scan_delay(self) -> float:
+        return self.scan_delay
+
+    def wait(self, timeout: float | None = None) -> bool:
+        woken: bool = self.new_row.wait(0 if timeout is None else timeout)
+        self.new_row.clear()
+        return woken
+
+    def get_latest_messages(self, limit: int) -> list[ChatMessage]:
+        return self.messages[-limit:]
+
+    def respond(self, response: ChatResponse) -> None:
+        if self.responses and self.failing_sends:
+            self.failing_sends -= 1
+            raise RuntimeError("chat input went stale")
+        self.responses.append(response)
+
+    def shutdown(self) -> None:
+        pass
+
+
+class FakeCharacter:
+    """Resolves canned messages straight to requests, with optional commentary."""
+
+    def __init__(
+        self,
+        requests: dict[str, Request],
+        commentary: dict[str, str | Exception] | None = None,
+    ) -> None:
+        self.requests: dict[str, Request] = requests
+        self.commentary: dict[str, str | Exception] = commentary or {}
+
+    def resolve(self, message: str) -> tuple[Request, Future[str | None]]:
+        output_text: Future[str | None] = Future()
+        text: str | Exception | None = self.commentary.get(message)
+        if isinstance(text, Exception):
+            output_text.set_exception(text)
+        else:
+            output_text.set_result(text)
+        return self.requests[message], output_text
+
+    def get_init_message(self) -> str:
+        return "ready"
+
+    def get_random_phrase(self) -> str:
+        return "still here"
+
+    def get_error_message(self) -> str:
+        return "error"
+
+
+@pytest.fixture
+def herder(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> AlpacaHerder:
+    # every sqlite connection is opened here, on the main thread
+    monkeypatch.setattr(alpaca.client.TestClient, "DB_PATH_ROOT", tmp_path)
+    client: alpaca.client.TestClient = alpaca.client.TestClient(
+        base_url="http://localhost", api_key="k", api_secret="s", test_id="broker"
+    )
+    monkeypatch.setattr(client, "get_quote", lambda symbol: SimpleNamespace(ap=100.0))
+    journal: OrderJournal = OrderJournal(name="broker", db_path=tmp_path / "j.db")
+    return AlpacaHerder(
+        env=Environment.TEST,
+        exchange=Exchange(client=client, name="cardo", journal=journal),
+        ledger=Ledger(client=client),
+        visualizer=DataVisualizer(
+            name="test", warm_renderer=False, render_root=tmp_path / "renders"
+        ),
+    )
+
+
+async def run_until_answered(
+    broker: Broker, messenger: FakeMessenger, num_responses: int
+) -> None:
+    pipeline: asyncio.Task = asyncio.create_task(broker.run_async())
+    async with asyncio.timeout(RESPONSE_TIMEOUT):
+        while len(messenger.responses) < num_responses:
+            await asyncio.sleep(0.01)
+    pipeline.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await pipeline
+
+
+def test_run_async_dispatches_requests(herder: AlpacaHerder) -> None:
+    messenger: FakeMessenger = FakeMessenger()
+    character: FakeCharacter = FakeCharacter(
+        {
+            "buy": SubmitTradeRequest(
+                symbol="AAPL", qty=2, side=OrderSide.BUY, type=OrderType.MARKET
+            ),
+            "orders": GetOrdersRequest(window=MetricWindow.TOTAL),
+        }
+    )
+    broker: Broker = Broker(
+        name="cardo",
+        messenger=messenger,
+        character=character,
+        herder=herder,
+        max_lag=3600,
+    )
+    broker.start()
+
+    # the order has to be journaled before it's listed, so requests go one at a time
+    messenger.messages.append(ChatMessage(id="1", text="buy"))
+    asyncio.run(run_until_answered(broker, messenger, 2))
+    messenger.messages.append(ChatMessage(id="2", text="orders"))
+    asyncio.run(run_until_answered(broker, messenger, 3))
+
+    init, trade, orders = messenger.responses
+    assert trade.message.startswith("Order was successfully filled!")
+    assert orders.message == "Done fetching filled orders."
+    assert Path(orders.img_path).exists()
+
+
+def test_run_async_survives_failing_stages(herder: AlpacaHerder) -> None:
+    # one send fails, then a commentary call fails
+    messenger: FakeMessenger = FakeMessenger(failing_sends=1)
+    character: FakeCharacter = FakeCharacter(
+        {"hello": NullRequest(), "boom": NullRequest(), "again": NullRequest()},
+        commentary={
+            "hello": "hello back",
+            "boom": RuntimeError("completion failed"),
+            "again": "still here",
+        },
+    )
+    broker: Broker = Broker(
+        name="cardo",
+        messenger=messenger,
+        character=character,
+        herder=herder,
+        max_lag=3600,
+    )
+    broker.start()
+
+    for i, text in enumerate(["hello", "boom", "again"], start=1):
+        messenger.messages.append(ChatMessage(id=str(i), text=text))
+    asyncio.run(run_until_answered(broker, messenger, 2))
+
+    assert [r.message for r in messenger.responses] == ["ready", "still here"]
+
+
+def test_new_message_wakes_async_scan(herder: AlpacaHerder) -> None:
+    scan_delay: float = 60.0
+    messenger: FakeMessenger = FakeMessenger(scan_delay=scan_delay)
+    character: FakeCharacter = FakeCharacter(
+        {"hello": NullRequest()}, commentary={"hello": "hello back"}
+    )
+    broker: Broker = Broker(
+        name="cardo",
+        messenger=messenger,
+        character=character,
+        herder=herder,
+        max_lag=3600,
+    )
+    broker.start()
+
+    async def answer_time() -> float:
+        pipeline: asyncio.Task = asyncio.create_task(broker.run_async())
+        # let the scanner settle into its wait before the message lands
+        await asyncio.sleep(0.2)
+        posted: float = time.monotonic()
+        messenger.post(ChatMessage(id="1", text="hello"))
+        async with asyncio.timeout(RESPONSE_TIMEOUT):
+            while len(messenger.responses) < 2:
+                await asyncio.sleep(0.01)
+        answered: float = time.monotonic()
+        pipeline.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await pipeline
+        return answered - posted
+
+    # answered off the observer, long before the next scheduled scan
+    assert asyncio.run(answer_time()) < 1.0
+    assert messenger.responses[-1].message == "hello back"
@@ -0,0 +1,20 @@
+from agent.character import LlmCharacter
+from agent.examples import ExampleIndex
+
+
+CONTEXT_EXAMPLES: str = """
+User: cardo buy 10 AAPL
+Output: {"request_type": "SubmitTradeRequest", "symbol": "AAPL", "qty": 10}
+
+User: cardo show my weekly orders
+Output: {"request_type": "GetOrdersRequest", "window": "weekly"}
+"""
+
+
+def test_multi_line_examples_stay_whole() -> None:
+    examples: list[str] = LlmCharacter._to_example_list(CONTEXT_EXAMPLES)
+    assert len(examples) == 2
+    assert all(e.startswith("User:") and "\nOutput:" in e for e in examples)
+
+    top: list[str] = ExampleIndex(examples).top_k("cardo weekly orders", 1)
+    assert top == [examples[1]]
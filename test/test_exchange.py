@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+from alpaca.exchange import Exchange
+
+
+ORDER_ID: str = "order-1"
+
+
+class PendingClient:
+    """Reports every order as still accepted, counting status lookups."""
+
+    def __init__(self) -> None:
+        self.lookups: int = 0
+
+    def get_order(self, id: str) -> SimpleNamespace:
+        self.lookups += 1
+        return SimpleNamespace(id=id, status="accepted")
+
+
+class SilentListener:
+    def __init__(self, running: bool) -> None:
+        self.running: bool = running
+        self.waits: int = 0
+
+    def is_running(self) -> bool:
+        return self.running
+
+    def wait_for_status(
+        self, order_id: str, statuses: frozenset[str], timeout: float
+    ) -> None:
+        self.waits += 1
+
+
+def check_status(listener: SilentListener) -> PendingClient:
+    client: PendingClient = PendingClient()
+    exchange: Exchange = Exchange(
+        client=client,
+        name="cardo",
+        poll_interval=0.001,
+        timeout=0.0055,
+        listener=listener,
+    )
+    assert exchange._check_status_periodically(ORDER_ID) is None
+    return client
+
+
+def test_live_stream_only_falls_back_to_rest_occasionally() -> None:
+    listener: SilentListener = SilentListener(running=True)
+    client: PendingClient = check_status(listener)
+    # REST on the 3rd wait and once more on the last of 6
+    assert listener.waits == 6
+    assert client.lookups == 2
+
+
+def test_stopped_stream_polls_rest_every_interval() -> None:
+    listener: SilentListener = SilentListener(running=False)
+    client: PendingClient = check_status(listener)
+    assert listener.waits == 0
+    assert client.lookups == 6
@@ -0,0 +1,63 @@
+import pytest
+
+from agent.intent import IntentParser
+from stubs import (
+    GetOrdersRequest,
+    GetPnlRequest,
+    MetricWindow,
+    OrderSide,
+    OrderType,
+    Request,
+    SubmitTradeRequest,
+)
+
+
+@pytest.fixture
+def parser() -> IntentParser:
+    return IntentParser("cardo")
+
+
+@pytest.mark.parametrize(
+    "message, expected",
+    [
+        (
+            "cardo buy 10 AAPL",
+            SubmitTradeRequest(
+                symbol="AAPL", qty=10, side=OrderSide.BUY, type=OrderType.MARKET
+            ),
+        ),
+        (
+            "cardo sell 2.5 $f limit",
+            SubmitTradeRequest(
+                symbol="F", qty=2.5, side=OrderSide.SELL, type=OrderType.LIMIT
+            ),
+        ),
+        (
+            "hey cardo show me my weekly orders",
+            GetOrdersRequest(window=MetricWindow.WEEKLY),
+        ),
+        ("cardo daily pnl", GetPnlRequest(window=MetricWindow.DAILY)),
+    ],
+)
+def test_parses_unambiguous_commands(
+    parser: IntentParser, message: str, expected: Request
+) -> None:
+    assert parser.parse(message) == expected
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "cardo would you buy 10 AAPL?",
+        "cardo could you sell 100 TSLA?",
+        "cardo can buy 10 AAPL",
+        "cardo buy 10 AAPL?",
+        "cardo what is my daily pnl",
+        "cardo buy 10 I",
+        "cardo buy 10 apple",
+    ],
+)
+def test_leaves_questions_and_loose_phrasings_to_the_llm(
+    parser: IntentParser, message: str
+) -> None:
+    assert parser.parse(message) is None
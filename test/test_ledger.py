@@ -0,0 +1,127 @@
+import datetime
+from collections import defaultdict, deque
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from alpaca.frame import build_order_frame
+from alpaca.ledger import PNL_COLUMNS, Ledger
+from alpaca.utils import is_mkt_open
+
+
+SYMBOLS: list[str] = ["AAPL", "MSFT", "TSLA"]
+NUM_FILLS: int = 60
+HISTORY: pd.Timedelta = pd.Timedelta(days=10)
+
+
+def reference_running_pnl(
+    orders: pd.DataFrame, mkt_price: dict[str, pd.Series], now: pd.Timestamp
+) -> pd.DataFrame:
+    """The minute-by-minute loop the vectorized running pnl replaced."""
+    start = end = now.floor("min")
+    ts_to_orders: dict[pd.Timestamp, list] = defaultdict(list)
+    for o in orders.itertuples():
+        fill_time: pd.Timestamp = o.timestamp.floor("min")
+        start = min(fill_time, start)
+        ts_to_orders[fill_time].append(o)
+
+    position_lots: dict[str, deque[tuple[float, float]]] = defaultdict(deque)
+    realized_pnl: float = 0.0
+
+    pnl_snapshots = []
+    timeline: list[pd.Timestamp] = [
+        ts
+        for ts in pd.date_range(
+            start=start, end=end, freq="1min", tz=datetime.timezone.utc
+        )
+        if is_mkt_open(ts)
+    ]
+    for timestamp in timeline:
+        for order in ts_to_orders[timestamp]:
+            qty: float = order.qty
+            if order.side == "buy":
+                position_lots[order.asset].append((qty, order.price))
+            else:
+                while qty > 0 and position_lots[order.asset]:
+                    lot_qty, lot_price = position_lots[order.asset].popleft()
+                    matched_qty = min(qty, lot_qty)
+                    realized_pnl += matched_qty * (order.price - lot_price)
+                    qty -= matched_qty
+                    if lot_qty > matched_qty:
+                        position_lots[order.asset].appendleft(
+                            (lot_qty - matched_qty, lot_price)
+                        )
+
+        unrealized_pnl: float = 0.0
+        for symbol, lots in position_lots.items():
+            market_price = mkt_price[symbol][timestamp]
+            for qty, entry_price in lots:
+                unrealized_pnl += qty * (market_price - entry_price)
+
+        pnl_snapshots.append(
+            {
+                "timestamp": timestamp,
+                "realized_pnl": realized_pnl,
+                "unrealized_pnl": unrealized_pnl,
+                "total_pnl": realized_pnl + unrealized_pnl,
+            }
+        )
+
+    return pd.DataFrame(pnl_snapshots)
+
+
+def random_history(
+    seed: int, now: pd.Timestamp
+) -> tuple[pd.DataFrame, dict[str, pd.Series]]:
+    """
+    Long-only fills during market hours over the last few days, with a random
+    walk of minute prices per symbol.
+    """
+    rng: np.random.Generator = np.random.default_rng(seed)
+    end: pd.Timestamp = now.floor("min")
+    minutes: pd.DatetimeIndex = pd.date_range(end - HISTORY, end, freq="1min")
+    open_minutes: pd.DatetimeIndex = minutes[[is_mkt_open(ts) for ts in minutes]]
+
+    fill_times: pd.DatetimeIndex = open_minutes[
+        np.sort(rng.choice(len(open_minutes), NUM_FILLS))
+    ] + pd.to_timedelta(rng.integers(0, 60, NUM_FILLS), unit="s")
+    held: dict[str, float] = defaultdict(float)
+    rows: list[tuple] = []
+    for ts in fill_times:
+        symbol: str = str(rng.choice(SYMBOLS))
+        qty: float = float(rng.integers(1, 10))
+        side: str = "sell" if held[symbol] >= qty and rng.random() < 0.4 else "buy"
+        held[symbol] += qty if side == "buy" else -qty
+        rows.append((ts.isoformat(), symbol, "market", side, qty, rng.uniform(50, 150)))
+
+    mkt_price: dict[str, pd.Series] = {
+        sym: pd.Series(100 + rng.normal(0, 0.5, len(minutes)).cumsum(), index=minutes)
+        for sym in SYMBOLS
+    }
+    return build_order_frame(*zip(*rows)), mkt_price
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_running_pnl_matches_reference_loop(
+    monkeypatch: pytest.MonkeyPatch, seed: int
+) -> None:
+    # one clock for both sides, so they can't straddle a minute boundary
+    now: pd.Timestamp = pd.Timestamp.now(tz=datetime.timezone.utc)
+    orders, mkt_price = random_history(seed, now)
+    monkeypatch.setattr(Ledger, "_get_bars", lambda self, orders: mkt_price)
+
+    expected: pd.DataFrame = reference_running_pnl(orders, mkt_price, now)
+    actual: pd.DataFrame = Ledger(client=None).get_total_running_pnl(orders, now)
+
+    assert list(actual.columns) == PNL_COLUMNS
+    pd.testing.assert_frame_equal(
+        actual, expected, check_dtype=False, check_index_type=False
+    )
+
+
+def test_running_pnl_without_orders() -> None:
+    orders: pd.DataFrame = build_order_frame([], [], [], [], [], [])
+    pnl: pd.DataFrame = Ledger(client=None).get_total_running_pnl(orders)
+    assert pnl.empty
+    assert list(pnl.columns) == PNL_COLUMNS
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from alpaca.frame import build_order_frame
+from alpaca.lots import LotBook, LotEngine
+
+
+def test_fractional_round_trip_closes_flat() -> None:
+    book: LotBook = LotBook()
+    book.apply(0.3, 100.0)
+    for _ in range(3):
+        book.apply(-0.1, 110.0)
+
+    assert not book.lots
+    assert book.qty == book.cost == 0.0
+    assert book.realized == pytest.approx(3.0)
+
+
+def test_fractional_partial_close_leaves_no_residue_lot() -> None:
+    book: LotBook = LotBook()
+    book.apply(0.1, 100.0)
+    book.apply(0.2, 105.0)
+    book.apply(-0.3, 110.0)
+    book.apply(0.7, 120.0)
+
+    assert [(lot.qty, lot.price) for lot in book.lots] == [(0.7, 120.0)]
+    assert book.qty == pytest.approx(0.7)
+
+
+def test_fill_past_flat_flips_position() -> None:
+    book: LotBook = LotBook()
+    book.apply(2.0, 100.0)
+    realized: float = book.apply(-3.0, 90.0)
+
+    assert realized == -20.0
+    assert book.qty == -1.0
+    assert book.cost == -90.0
+
+
+def test_history_matches_the_frame_it_was_read_for() -> None:
+    full: pd.DataFrame = build_order_frame(
+        [f"2025-01-02T15:{m:02d}:00Z" for m in range(40)],
+        ["AAPL", "MSFT"] * 20,
+        ["market"] * 40,
+        ["buy"] * 40,
+        [1.0] * 40,
+        [100.0] * 40,
+    )
+    # the lengths alternate, so every read resets the engine the other one built
+    frames: list[pd.DataFrame] = [full.head(n) for n in (10, 40) * 50]
+    engine: LotEngine = LotEngine()
+
+    def read(frame: pd.DataFrame) -> bool:
+        realized_after, sym_states = engine.get_history(frame)
+        fills: np.ndarray = np.concatenate([idx for idx, _, _ in sym_states.values()])
+        return len(realized_after) == len(frame) and fills.max() < len(frame)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        assert all(pool.map(read, frames))
@@ -0,0 +1,46 @@
+import time
+
+from agent.character import PhrasePool
+
+
+FILL_TIMEOUT: float = 5.0
+
+
+class CountingGenerator:
+    def __init__(self) -> None:
+        self.calls: int = 0
+
+    def __call__(self) -> str:
+        self.calls += 1
+        return f"phrase {self.calls}"
+
+
+def wait_for_fill(pool: PhrasePool) -> None:
+    deadline: float = time.monotonic() + FILL_TIMEOUT
+    while len(pool.phrases) < pool.depth and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_pool_refills_after_get() -> None:
+    generate: CountingGenerator = CountingGenerator()
+    pool: PhrasePool = PhrasePool(
+        name="rand", generate=generate, depth=2, dedup_window=4
+    )
+    wait_for_fill(pool)
+
+    assert pool.get() == "phrase 1"
+    wait_for_fill(pool)
+    assert generate.calls == 3
+
+
+def test_one_shot_pool_is_not_refilled() -> None:
+    generate: CountingGenerator = CountingGenerator()
+    pool: PhrasePool = PhrasePool(
+        name="init", generate=generate, depth=1, dedup_window=4, one_shot=True
+    )
+    wait_for_fill(pool)
+
+    assert pool.get() == "phrase 1"
+    time.sleep(0.2)
+    assert generate.calls == 1
+    assert not pool.phrases
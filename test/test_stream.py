@@ -0,0 +1,39 @@
+import time
+
+import pytest
+from alpaca_trade_api.entity import Order
+from local_stream import LocalTradeStream
+
+from alpaca.stream import TradeUpdateListener
+
+
+CONNECT_TIMEOUT: float = 10.0
+
+
+@pytest.fixture
+def stream() -> LocalTradeStream:
+    stream: LocalTradeStream = LocalTradeStream()
+    stream.start()
+    yield stream
+    stream.stop()
+
+
+def test_listener_wakes_on_streamed_fill(stream: LocalTradeStream) -> None:
+    listener = TradeUpdateListener(
+        base_url=stream.base_url, api_key="k", api_secret="s"
+    )
+    listener.start()
+    deadline: float = time.monotonic() + CONNECT_TIMEOUT
+    while not stream.clients and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert stream.clients, "listener never subscribed to trade_updates"
+
+    order: dict = {"id": "order-1", "symbol": "AAPL", "status": "filled"}
+    assert listener.wait_for_status("order-1", {"filled"}, timeout=0.1) is None
+    stream.publish("fill", order)
+    streamed: Order | None = listener.wait_for_status(
+        "order-1", frozenset({"filled"}), timeout=CONNECT_TIMEOUT
+    )
+    assert streamed is not None
+    assert streamed.symbol == "AAPL"
+    listener.stop()
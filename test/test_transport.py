@@ -0,0 +1,53 @@
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+
+from agent.transport import CassetteTransport, TransportMode
+from errors import CassetteMiss
+
+
+BASE_URL: str = "https://api.openai.com/v1"
+
+
+def fake_completions(request: httpx.Request) -> httpx.Response:
+    """Stands in for the completions API, answering each prompt distinctly."""
+    prompt: str = json.loads(request.content)["messages"][-1]["content"]
+    return httpx.Response(200, json={"choices": [{"text": f"re: {prompt}"}]})
+
+
+def complete(client: httpx.Client, prompt: str, **params) -> httpx.Response:
+    body: dict = {"messages": [{"role": "user", "content": prompt}], **params}
+    return client.post("/chat/completions", json=body)
+
+
+def test_replays_recorded_completions(tmp_path: Path) -> None:
+    cassette: Path = tmp_path / "cassettes" / "session.jsonl"
+    recorder: CassetteTransport = CassetteTransport(
+        mode=TransportMode.RECORD, cassette=cassette
+    )
+    recorder.live = httpx.MockTransport(fake_completions)
+    with httpx.Client(base_url=BASE_URL, transport=recorder) as client:
+        recorded: list[httpx.Response] = [
+            complete(client, prompt, model="gpt", temperature=0.5)
+            for prompt in ("buy 10 AAPL", "daily pnl")
+        ]
+
+    # replay runs with no live transport at all
+    replayer: CassetteTransport = CassetteTransport(
+        mode=TransportMode.REPLAY, cassette=cassette
+    )
+    assert replayer.live is None
+    with httpx.Client(base_url=BASE_URL, transport=replayer) as client:
+        # body keys are matched regardless of their order
+        replayed: list[httpx.Response] = [
+            complete(client, prompt, temperature=0.5, model="gpt")
+            for prompt in ("buy 10 AAPL", "daily pnl")
+        ]
+        for before, after in zip(recorded, replayed):
+            assert after.status_code == before.status_code
+            assert after.json() == before.json()
+
+        with pytest.raises(CassetteMiss):
+            complete(client, "weekly orders", model="gpt", temperature=0.5)
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from canvas.utils import lttb_indices
+from canvas.visualizer import PNL_PLOT_WIDTH, DataVisualizer, PnlPlotJob
+from stubs import MetricWindow
+
+
+def test_pnl_job_ships_only_kept_points() -> None:
+    rng: np.random.Generator = np.random.default_rng(0)
+    minutes: pd.DatetimeIndex = pd.date_range(
+        "2025-01-02 14:30", periods=20 * PNL_PLOT_WIDTH, freq="1min", tz="UTC"
+    )
+    realized: np.ndarray = rng.normal(size=len(minutes)).cumsum()
+    unrealized: np.ndarray = rng.normal(size=len(minutes)).cumsum()
+    df: pd.DataFrame = pd.DataFrame(
+        {
+            "timestamp": minutes,
+            "realized_pnl": realized,
+            "unrealized_pnl": unrealized,
+            "total_pnl": realized + unrealized,
+        }
+    )
+
+    job: PnlPlotJob = DataVisualizer._pnl_job(df, MetricWindow.TOTAL)
+
+    assert len(job.timestamps) <= 3 * PNL_PLOT_WIDTH < len(df)
+    epochs: np.ndarray = minutes.as_unit("ns").asi8
+    for column, name in (
+        ("total_pnl", "Total PnL"),
+        ("realized_pnl", "Realized PnL"),
+        ("unrealized_pnl", "Unrealized PnL"),
+    ):
+        keep: np.ndarray = lttb_indices(df[column].to_numpy(), PNL_PLOT_WIDTH)
+        positions, values = job.traces[name]
+        np.testing.assert_array_equal(job.timestamps[positions], epochs[keep])
+        np.testing.assert_array_equal(values, df[column].to_numpy()[keep])